@@ -0,0 +1,238 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag, recipe_prefetches
+
+from .middleware import profile_segment
+from .serializers import (IngredientSerializer, ReadOnlyRecipeSerializer,
+                          TagSerializer,)
+
+RECIPE_CACHE_SIZE = getattr(settings, 'RECIPE_CACHE_SIZE', 2048)
+
+CatalogEntry = namedtuple('CatalogEntry', ('version', 'body', 'etag'))
+
+
+class CatalogCache:
+    """Сериализованный в JSON справочник с версией.
+
+    Версия хранится в общем кеше Django, поэтому сброс в одном процессе
+    виден остальным. Готовый JSON держится и в общем кеше, и в памяти
+    процесса: пока версия не изменилась, запрос к справочнику стоит
+    одного обращения к кешу и ни одного к базе.
+    """
+
+    def __init__(self, name, queryset, serializer_class):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.version_key = f'catalog:{name}:version'
+        self._local = None
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def build(self):
+        serializer = self.serializer_class(self.queryset.all(), many=True)
+        return JSONRenderer().render(serializer.data)
+
+    def get(self):
+        version = self.get_version()
+        if self._local is not None and self._local.version == version:
+            return self._local
+        data_key = f'catalog:{self.name}:{version}'
+        body = cache.get(data_key)
+        if body is None:
+            body = self.build()
+            cache.set(data_key, body, None)
+        self._local = CatalogEntry(
+            version, body, f'"{self.name}-{version}"'
+        )
+        return self._local
+
+    def invalidate(self):
+        cache.set(self.version_key, time.time_ns(), None)
+        self._local = None
+
+    def response(self, request):
+        entry = self.get()
+        last_modified = entry.version // 10 ** 9
+        response = get_conditional_response(
+            request, etag=entry.etag, last_modified=last_modified
+        )
+        if response is None:
+            response = HttpResponse(
+                entry.body, content_type='application/json'
+            )
+        response['ETag'] = entry.etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class TagIdCache:
+    """Соответствие slug -> id тегов в памяти процесса.
+
+    Перечитывается из базы, когда меняется версия справочника тегов.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._version = None
+        self._ids = {}
+
+    def get(self):
+        version = self.catalog.get_version()
+        if version != self._version:
+            self._ids = dict(Tag.objects.values_list('slug', 'id'))
+            self._version = version
+        return self._ids
+
+
+tag_catalog = CatalogCache('tags', Tag.objects.all(), TagSerializer)
+ingredient_catalog = CatalogCache(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer
+)
+tag_ids = TagIdCache(tag_catalog)
+
+
+class CachedCatalogMixin:
+    """Отдаёт нефильтрованный список справочника из CatalogCache."""
+
+    catalog = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.catalog.response(request)
+
+
+class RecipeCache:
+    """Представление рецепта без полей текущего пользователя: LRU в памяти
+    процесса с ключом по id рецепта.
+
+    Запись годна, пока совпадает отметка рецепта - дата изменения и поля
+    автора, поэтому правки в других процессах не отдаются устаревшими.
+    Сигналы удаляют записи своего процесса сразу. Флаги пользователя
+    берутся из аннотаций with_user_flags() той же выборки, а адрес
+    картинки достраивается под хост запроса.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def stamp(recipe):
+        author = recipe.author
+        return (
+            recipe.updated_at, author.pk, author.email, author.username,
+            author.first_name, author.last_name,
+        )
+
+    def _get(self, recipe):
+        with self._lock:
+            entry = self._local.get(recipe.pk)
+            if entry is not None and entry[0] == self.stamp(recipe):
+                self._local.move_to_end(recipe.pk)
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+            return None
+
+    def _set(self, recipe, data):
+        with self._lock:
+            self._local[recipe.pk] = (self.stamp(recipe), data)
+            self._local.move_to_end(recipe.pk)
+            while len(self._local) > self.size:
+                self._local.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def build(self, recipes):
+        """Сериализовать рецепты без запроса: флаги пользователя ложны,
+        картинка - относительным адресом."""
+        prefetch_related_objects(recipes, *recipe_prefetches())
+        data = ReadOnlyRecipeSerializer(
+            recipes, many=True, context={'request': None}
+        ).data
+        for item in data:
+            item['is_favorited'] = item['is_in_shopping_cart'] = False
+            item['author']['is_subscribed'] = False
+        return data
+
+    def render(self, recipes, request):
+        """Данные ReadOnlyRecipeSerializer для рецептов, загруженных с
+        select_related('author') и with_user_flags()."""
+        with profile_segment(request, 'serialize'):
+            return self._render(recipes, request)
+
+    def _render(self, recipes, request):
+        cached = [self._get(recipe) for recipe in recipes]
+        missing = [
+            recipe for recipe, data in zip(recipes, cached) if data is None
+        ]
+        if missing:
+            built = iter(self.build(missing))
+            for index, recipe in enumerate(recipes):
+                if cached[index] is None:
+                    cached[index] = next(built)
+                    self._set(recipe, cached[index])
+        result = []
+        for recipe, base in zip(recipes, cached):
+            data = dict(base)
+            data['author'] = dict(
+                base['author'], is_subscribed=recipe.is_author_subscribed
+            )
+            data['is_favorited'] = recipe.is_favorited
+            data['is_in_shopping_cart'] = recipe.is_in_shopping_cart
+            if data['image']:
+                data['image'] = request.build_absolute_uri(data['image'])
+            data['image_variants'] = {
+                variant: request.build_absolute_uri(url)
+                for variant, url in base['image_variants'].items()
+            }
+            result.append(data)
+        return result
+
+    def invalidate(self, *pks):
+        with self._lock:
+            for pk in pks:
+                self._local.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def invalidate_author(self, author_id):
+        """Удалить рецепты автора, не обращаясь к базе."""
+        with self._lock:
+            for pk in [
+                pk for pk, (stamp, _) in self._local.items()
+                if stamp[1] == author_id
+            ]:
+                del self._local[pk]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, size=len(self._local))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = (
+            round(stats['hits'] / lookups, 4) if lookups else 0
+        )
+        return stats
+
+
+recipe_cache = RecipeCache(RECIPE_CACHE_SIZE)
@@ -0,0 +1,50 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .cache import ingredient_catalog, tag_catalog
+
+
+def recipes_etag(request, recipes, envelope=None):
+    """ETag выдачи рецептов.
+
+    Строится по тому, от чего зависит ответ: адресу запроса, обёртке
+    пагинации (count, next, previous), версиям справочников тегов и
+    ингредиентов и для каждого рецепта - дате изменения, полям автора и
+    флагам текущего пользователя. Рецепты должны быть загружены с
+    select_related('author') и with_user_flags(), тогда расчёт не делает
+    запросов к базе.
+    """
+    parts = [
+        request.build_absolute_uri(),
+        envelope,
+        tag_catalog.get_version(),
+        ingredient_catalog.get_version(),
+    ]
+    for recipe in recipes:
+        author = recipe.author
+        parts.append((
+            recipe.pk,
+            recipe.updated_at.isoformat(),
+            recipe.is_favorited,
+            recipe.is_in_shopping_cart,
+            recipe.is_author_subscribed,
+            author.pk,
+            author.email,
+            author.username,
+            author.first_name,
+            author.last_name,
+        ))
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def conditional_response(request, etag, build):
+    """Ответить 304, если у клиента актуальная версия, иначе собрать
+    ответ функцией build(). В обоих случаях выставляет ETag."""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -0,0 +1,124 @@
+import base64
+import binascii
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from recipes.images import variant_names
+from recipes.models import ImageStatus
+
+RECIPE_IMAGE_MAX_SIZE = getattr(
+    settings, 'RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024
+)
+RECIPE_IMAGE_MAX_SIDE = getattr(settings, 'RECIPE_IMAGE_MAX_SIDE', 6000)
+DECODE_CHUNK_SIZE = 64 * 1024
+BASE64_HEADER_END = ';base64,'
+IMAGE_FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+    'GIF': ('gif', 'image/gif'),
+    'WEBP': ('webp', 'image/webp'),
+}
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Картинка в base64 без лишних копий в памяти.
+
+    Размер проверяется по длине строки ещё до декодирования. Строка
+    декодируется частями прямо во временный файл, формат и размеры
+    берутся из заголовка картинки, не распаковывая её целиком. Готовый
+    файл переносится в MEDIA_ROOT без копирования, уменьшенные копии
+    строит команда process_images.
+    """
+
+    default_error_messages = {
+        'too_large': 'Размер картинки не должен превышать {max_size} МБ.',
+        'too_big': (
+            'Стороны картинки не должны превышать {max_side} пикселей.'
+        ),
+    }
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        header_end = base64_data.find(BASE64_HEADER_END)
+        start = 0 if header_end < 0 else header_end + len(BASE64_HEADER_END)
+        size = (len(base64_data) - start) * 3 // 4
+        if size > RECIPE_IMAGE_MAX_SIZE:
+            self.fail(
+                'too_large', max_size=RECIPE_IMAGE_MAX_SIZE // 1024 // 1024
+            )
+        upload = TemporaryUploadedFile(str(uuid.uuid4()), None, size, None)
+        try:
+            self.decode(base64_data, start, upload)
+            self.check_image(upload)
+        except Exception:
+            upload.close()
+            raise
+        return serializers.ImageField.to_internal_value(self, upload)
+
+    def decode(self, base64_data, start, upload):
+        """Декодировать частями, пропуская переводы строк и пробелы.
+        Остаток части, не кратный 4 символам, переносится в следующую."""
+        rest = ''
+        try:
+            for offset in range(start, len(base64_data), DECODE_CHUNK_SIZE):
+                chunk = rest + ''.join(
+                    base64_data[offset:offset + DECODE_CHUNK_SIZE].split()
+                )
+                end = len(chunk) - len(chunk) % 4
+                upload.write(base64.b64decode(chunk[:end], validate=True))
+                rest = chunk[end:]
+            if rest:
+                upload.write(base64.b64decode(rest, validate=True))
+        except (binascii.Error, ValueError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        upload.size = upload.tell()
+        upload.seek(0)
+
+    def check_image(self, upload):
+        try:
+            with Image.open(upload.temporary_file_path()) as image:
+                image_format, (width, height) = image.format, image.size
+        except (OSError, Image.DecompressionBombError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        if image_format not in IMAGE_FORMATS:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        if max(width, height) > RECIPE_IMAGE_MAX_SIDE:
+            self.fail('too_big', max_side=RECIPE_IMAGE_MAX_SIDE)
+        extension, upload.content_type = IMAGE_FORMATS[image_format]
+        upload.name = f'{upload.name}.{extension}'
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии картинки рецепта.
+
+    Пока копии не готовы, каждая ссылка ведёт на оригинал.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return {}
+        names = variant_names(recipe.image.name)
+        if recipe.image_status != ImageStatus.READY:
+            names = dict.fromkeys(names, recipe.image.name)
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in names.items():
+            url = recipe.image.storage.url(name)
+            urls[variant] = (
+                request.build_absolute_uri(url) if request is not None
+                else url
+            )
+        return urls
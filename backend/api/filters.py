@@ -1,25 +1,48 @@
+from django.db.models import (Case, Exists, IntegerField, OuterRef, Value,
+                              When,)
+from django.db.models.functions import Lower
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Recipe
+from recipes.models import Favorite, Recipe, ShoppingCart, TagRecipe
+
+from .cache import tag_ids
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_ids.get()]
 
 
 class RecipeFilter(FilterSet):
     author = filters.CharFilter(field_name='author__id')
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='filter_tags'
+    )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        ids = tag_ids.get()
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=[ids[slug] for slug in value]
+        )))
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorite__user=self.request.user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return queryset.filter(Exists(ShoppingCart.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
 
     class Meta:
@@ -27,5 +50,80 @@ class RecipeFilter(FilterSet):
         fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
 
 
-class IngredientSearchFilter(SearchFilter):
+class RecipeSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск рецептов по ?search= в названии, ингредиентах
+    и описании."""
+
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return queryset.search(query)
+
+
+class RecipeOrderingFilter(BaseFilterBackend):
+    """Сортировка рецептов: по умолчанию новые первыми, при поиске - по
+    релевантности, с ?ordering=popular - по числу добавлений в
+    избранное."""
+
+    ordering_param = 'ordering'
+    orderings = {
+        'popular': ('-favorites_count', '-id'),
+    }
+    default_ordering = ('-id',)
+    search_ordering = ('-search_rank', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_param)
+        if ordering in self.orderings:
+            return self.orderings[ordering]
+        if 'search_rank' in queryset.query.annotations:
+            return self.search_ordering
+        return self.default_ordering
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset.order_by(*self.get_ordering(request, queryset, view))
+
+
+class IngredientSearchFilter(BaseFilterBackend):
+    """Автодополнение ингредиентов по ?name=.
+
+    Короткие запросы ищутся только по началу названия (индекс
+    text_pattern_ops), более длинные - по вхождению подстроки (индекс
+    pg_trgm), при этом совпадения по началу идут первыми. Количество
+    результатов ограничено ?limit=.
+    """
+
     search_param = 'name'
+    limit_param = 'limit'
+    default_limit = 20
+    max_limit = 100
+    min_contains_length = 3
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip().lower()
+        if not name:
+            return queryset
+        queryset = queryset.annotate(name_lower=Lower('name'))
+        if len(name) < self.min_contains_length:
+            queryset = queryset.filter(name_lower__startswith=name)
+        else:
+            queryset = queryset.filter(name_lower__contains=name).annotate(
+                rank=Case(
+                    When(name_lower__startswith=name, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            ).order_by('rank', 'name')
+        if getattr(view, 'action', None) != 'list':
+            return queryset
+        return queryset[:self.get_limit(request)]
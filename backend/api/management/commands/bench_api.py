@@ -0,0 +1,295 @@
+import io
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.filters import RecipeFilter
+from recipes.models import Ingredient, Recipe, SimilarRecipe, Tag
+from recipes.recommendations import rebuild
+from recipes.synthetic import generate
+from users.models import Follow, User
+
+PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Ручной замер API: заполняет тестовую базу синтетическими '
+        'данными, вызывает каждый маршрут api/urls.py и users/urls.py и '
+        'печатает число SQL-запросов и время. Потолки в сборке проверяет '
+        'pytest, см. tests/test_query_ceilings.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='не пересоздавать тестовую базу, если она уже есть',
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root):
+                self.seed(options)
+                self.failures = []
+                self.run_cases()
+                self.check_query_plans()
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+        if self.failures:
+            raise CommandError(
+                'Превышены потолки запросов:\n' + '\n'.join(self.failures)
+            )
+        self.stdout.write(self.style.SUCCESS('Все потолки соблюдены.'))
+
+    def seed(self, options):
+        start = time.perf_counter()
+        if not Ingredient.objects.exists():
+            call_command('importdata', 'ingredients', stdout=io.StringIO())
+        user_ids, recipe_ids = generate(
+            users=options['users'], recipes=options['recipes'],
+            seed=options['seed'], prefix='bench',
+        )
+        self.user_id = user_ids[0]
+        self.author_id = (
+            Follow.objects.filter(follower_id=self.user_id)
+            .values_list('user_id', flat=True).first()
+        )
+        self.recipe_id = recipe_ids[0]
+        self.stdout.write(
+            f'Данные: {len(user_ids)} пользователей, {len(recipe_ids)} '
+            f'рецептов за {time.perf_counter() - start:.1f} с.'
+        )
+        start = time.perf_counter()
+        self.stdout.write(
+            f'Похожие рецепты: {rebuild()} рецептов за '
+            f'{time.perf_counter() - start:.1f} с.'
+        )
+        self.anon = APIClient()
+        self.client = APIClient()
+        token = Token.objects.create(user_id=self.user_id)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.get('/api/users/me/')
+
+    def case(self, name, max_queries, method, url, client=None, data=None,
+             status=None, **headers):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = getattr(client, method)(
+                url, data, format='json', **headers
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+        queries = len(context.captured_queries)
+        failed = queries > max_queries or (
+            status is not None and response.status_code != status
+        )
+        line = (
+            f'{name:<45}{response.status_code:>5}{queries:>5}/{max_queries:<4}'
+            f'{elapsed:>9.1f} мс'
+        )
+        self.stdout.write(self.style.ERROR(line) if failed else line)
+        if failed:
+            self.failures.append(line)
+        return response
+
+    def run_cases(self):
+        recipe = f'/api/recipes/{self.recipe_id}/'
+        tag = Tag.objects.first()
+        ingredient_ids = list(
+            Ingredient.objects.values_list('pk', flat=True)[:30]
+        )
+        payload = {
+            'name': 'Замер', 'text': 'Текст', 'cooking_time': 10,
+            'image': PNG, 'tags': [tag.pk],
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in ingredient_ids
+            ],
+        }
+        self.stdout.write(
+            f'{"маршрут":<45}{"код":>5}{"запросы":>10}{"время":>12}'
+        )
+        self.case('GET tags', 1, 'get', '/api/tags/', self.anon, status=200)
+        self.case('GET tags (cached)', 0, 'get', '/api/tags/', self.anon)
+        self.case('GET tag', 1, 'get', f'/api/tags/{tag.pk}/', self.anon)
+        self.case('GET ingredients', 1, 'get', '/api/ingredients/', self.anon)
+        self.case(
+            'GET ingredients (cached)', 0, 'get', '/api/ingredients/',
+            self.anon,
+        )
+        self.case(
+            'GET ingredients ?name=', 1, 'get', '/api/ingredients/?name=сах',
+            self.anon,
+        )
+        self.case(
+            'GET ingredient', 1, 'get',
+            f'/api/ingredients/{ingredient_ids[0]}/', self.anon,
+        )
+        self.case('GET recipes anon', 4, 'get', '/api/recipes/', self.anon)
+        for limit in (6, 24, 96):
+            response = self.case(
+                f'GET recipes ?limit={limit}', 4, 'get',
+                f'/api/recipes/?limit={limit}', status=200,
+            )
+        self.case(
+            'GET recipes If-None-Match', 2, 'get', '/api/recipes/?limit=96',
+            status=304, HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.case(
+            'GET recipes ?tags=&is_favorited=', 5, 'get',
+            f'/api/recipes/?tags={tag.slug}&is_favorited=1'
+            f'&is_in_shopping_cart=1&author={self.user_id}',
+        )
+        self.case(
+            'GET recipes ?ordering=popular', 4, 'get',
+            '/api/recipes/?ordering=popular',
+        )
+        self.case(
+            'GET recipes ?cursor=', 3, 'get', '/api/recipes/?cursor=&limit=24'
+        )
+        self.case(
+            'GET recipes ?search=', 4, 'get', '/api/recipes/?search=рецепт',
+            status=200,
+        )
+        cook = '/api/recipes/cook/?' + '&'.join(
+            f'ingredients={pk}' for pk in Recipe.objects.get(
+                pk=self.recipe_id
+            ).ingredients.values_list('pk', flat=True)[:3]
+        ) + '&min_coverage=0.3'
+        self.case('GET recipes/cook (build)', 4, 'get', cook, status=200)
+        self.case('GET recipes/cook', 4, 'get', cook, status=200)
+        similar = SimilarRecipe.objects.values_list('recipe', flat=True)[0]
+        self.case(
+            'GET recipe similar', 5, 'get',
+            f'/api/recipes/{similar}/similar/', status=200,
+        )
+        self.case(
+            'GET recipes/recommended', 4, 'get', '/api/recipes/recommended/',
+            status=200,
+        )
+        response = self.case('GET recipe', 3, 'get', recipe, status=200)
+        self.case(
+            'GET recipe If-None-Match', 1, 'get', recipe, status=304,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.case(
+            'GET download_shopping_cart', 1, 'get',
+            '/api/recipes/download_shopping_cart/', status=200,
+        )
+        self.case(
+            'GET download_shopping_cart csv', 1, 'get',
+            '/api/recipes/download_shopping_cart/?format=csv',
+        )
+        response = self.case(
+            'POST recipe (30 ingredients)', 10, 'post', '/api/recipes/',
+            data=payload, status=201,
+        )
+        own = f'/api/recipes/{response.json()["id"]}/'
+        payload['ingredients'][0]['amount'] = 20
+        payload['name'] = 'Замер 2'
+        self.case(
+            'PATCH recipe', 13, 'patch', own, data=payload, status=200
+        )
+        for action in ('favorite', 'shopping_cart'):
+            url = f'{own}{action}/'
+            self.case(f'POST {action}', 4, 'post', url, status=201)
+            self.case(f'POST {action} again', 3, 'post', url, status=400)
+            self.case(f'DELETE {action}', 3, 'delete', url, status=204)
+            ids = list(Recipe.objects.values_list('pk', flat=True)[:20])
+            self.case(
+                f'POST {action} bulk', 4, 'post', f'/api/recipes/{action}/',
+                data={'ids': ids}, status=200,
+            )
+            self.case(
+                f'DELETE {action} bulk', 4, 'delete',
+                f'/api/recipes/{action}/', data={'clear': True}, status=200,
+            )
+        self.case('DELETE recipe', 9, 'delete', own, status=204)
+
+        self.case('GET users', 2, 'get', '/api/users/', self.anon)
+        self.case('GET users auth', 3, 'get', '/api/users/', status=200)
+        self.case('GET user', 1, 'get', f'/api/users/{self.user_id}/')
+        self.case('GET users/me', 1, 'get', '/api/users/me/', status=200)
+        self.case(
+            'GET subscriptions', 3, 'get',
+            '/api/users/subscriptions/?recipes_limit=3', status=200,
+        )
+        self.case(
+            'GET subscriptions ?limit=24', 3, 'get',
+            '/api/users/subscriptions/?limit=24&recipes_limit=3',
+        )
+        subscribe = f'/api/users/{self.author_id}/subscribe/'
+        self.case('DELETE subscribe', 2, 'delete', subscribe, status=204)
+        self.case('POST subscribe', 4, 'post', subscribe, status=201)
+        self.case(
+            'POST users', 4, 'post', '/api/users/', self.anon, data={
+                'email': 'bench-new@example.com', 'username': 'bench-new',
+                'first_name': 'Имя', 'last_name': 'Фамилия',
+                'password': 'Bench-Password-1',
+            }, status=201,
+        )
+        login = self.case(
+            'POST auth/token/login', 6, 'post', '/api/auth/token/login/',
+            self.anon, data={
+                'email': 'bench-new@example.com',
+                'password': 'Bench-Password-1',
+            }, status=200,
+        )
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {login.json()["auth_token"]}'
+        )
+        self.case(
+            'POST users/set_password', 3, 'post', '/api/users/set_password/',
+            client, data={
+                'current_password': 'Bench-Password-1',
+                'new_password': 'Bench-Password-2',
+            }, status=204,
+        )
+        self.case(
+            'POST auth/token/logout', 4, 'post', '/api/auth/token/logout/',
+            client, status=204,
+        )
+
+    def check_query_plans(self):
+        """Комбинированный фильтр рецептов должен идти по индексам."""
+        if connection.vendor != 'sqlite':
+            return
+        request = RequestFactory().get('/api/recipes/')
+        request.user = User.objects.get(pk=self.user_id)
+        queryset = RecipeFilter(
+            {'tags': [Tag.objects.first().slug], 'is_favorited': 'true',
+             'is_in_shopping_cart': 'true', 'author': self.user_id},
+            queryset=Recipe.objects.all(), request=request,
+        ).qs
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        scans = [
+            line for line in plan
+            if line.startswith('SCAN') and 'INDEX' not in line
+        ]
+        self.stdout.write('План фильтра рецептов:\n  ' + '\n  '.join(plan))
+        if scans:
+            self.failures.append(f'Полный просмотр таблицы: {scans}')
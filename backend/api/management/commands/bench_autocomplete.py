@@ -0,0 +1,53 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер задержки автодополнения /api/ingredients/?name= '
+        'на каждое нажатие клавиши.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--words', type=int, default=50,
+            help='сколько случайных названий ингредиентов «набрать»',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('Каталог ингредиентов пуст.')
+        random.seed(options['seed'])
+        words = random.sample(names, min(options['words'], len(names)))
+        client = APIClient()
+        timings = {}
+        for word in words:
+            for length in range(1, len(word) + 1):
+                start = time.perf_counter()
+                response = client.get(
+                    '/api/ingredients/', {'name': word[:length]}
+                )
+                elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{word[:length]!r}: HTTP {response.status_code}'
+                    )
+                timings.setdefault(min(length, 10), []).append(elapsed)
+        self.stdout.write('символов  запросов   p50, мс   p95, мс   max, мс')
+        for length, values in sorted(timings.items()):
+            values.sort()
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            label = f'{length}+' if length == 10 else str(length)
+            self.stdout.write(
+                f'{label:>8} {len(values):>9} '
+                f'{statistics.median(values):>9.2f} {p95:>9.2f} '
+                f'{values[-1]:>9.2f}'
+            )
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.serializers import RecipeSerializer
+from recipes.models import ImageStatus, Ingredient, Recipe
+from users.models import User
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def replace_all(recipe, ingredients):
+    """Прежняя стратегия: удалить все строки и вставить заново."""
+    recipe.ingredient_recipe.all().delete()
+    RecipeSerializer().create_ingredients(recipe, ingredients)
+
+
+def diff_update(recipe, ingredients):
+    RecipeSerializer().update_ingredients(recipe, ingredients)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение объёма записи в IngredientRecipe при изменении рецепта: '
+        'полная перезапись против обновления по разнице. Все изменения '
+        'откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients', type=int, default=20,
+            help='сколько ингредиентов в рецепте',
+        )
+
+    def scenarios(self, ingredient_ids, extra_id):
+        """Сценарии для рецепта из ingredient_ids; extra_id - ингредиент
+        каталога, которого в рецепте нет."""
+        base = [{'id': pk, 'amount': 100} for pk in ingredient_ids]
+        changed = [dict(item) for item in base]
+        changed[0]['amount'] = 150
+        return base, (
+            ('без изменений', base),
+            ('одно количество', changed),
+            ('один добавлен', base + [{'id': extra_id, 'amount': 10}]),
+            ('один удалён', base[1:]),
+        )
+
+    def measure(self, strategy, recipe, ingredients):
+        before = set(recipe.ingredient_recipe.values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as context:
+            strategy(recipe, ingredients)
+        after = set(recipe.ingredient_recipe.values_list('pk', flat=True))
+        writes = sum(
+            query['sql'].lstrip().upper().startswith(WRITE_STATEMENTS)
+            for query in context.captured_queries
+        )
+        return len(before ^ after), writes, len(context.captured_queries)
+
+    def handle(self, *args, **options):
+        count = options['ingredients']
+        ingredient_ids = list(
+            Ingredient.objects.order_by('pk')
+            .values_list('pk', flat=True)[:count + 1]
+        )
+        if len(ingredient_ids) <= count:
+            raise CommandError(
+                f'Нужно хотя бы {count + 1} ингредиентов в каталоге.'
+            )
+        *ingredient_ids, extra_id = ingredient_ids
+        base, scenarios = self.scenarios(ingredient_ids, extra_id)
+
+        self.stdout.write(
+            f'{"сценарий":<18}{"стратегия":<12}'
+            f'{"удалено+вставлено":>20}{"записей":>10}{"запросов":>10}'
+        )
+        with transaction.atomic():
+            author = User.objects.create(
+                email='bench@example.com', username='bench-update'
+            )
+            recipe = Recipe.objects.create(
+                author=author, name='bench', text='bench',
+                cooking_time=1, image='recipes/bench.png',
+                image_status=ImageStatus.ORIGINAL,
+            )
+            for name, ingredients in scenarios:
+                for label, strategy in (
+                    ('перезапись', replace_all), ('по разнице', diff_update)
+                ):
+                    replace_all(recipe, base)
+                    churn, writes, queries = self.measure(
+                        strategy, recipe, ingredients
+                    )
+                    self.stdout.write(
+                        f'{name:<18}{label:<12}'
+                        f'{churn:>20}{writes:>10}{queries:>10}'
+                    )
+            transaction.set_rollback(True)
@@ -0,0 +1,81 @@
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка по журналу QueryProfilerMiddleware: время, запросы к базе, '
+        'сериализация и размер ответа по каждому view, самые частые N+1.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', type=str, default=None,
+            help='журнал профилировщика, по умолчанию QUERY_PROFILER_LOG',
+        )
+        parser.add_argument(
+            '--sort',
+            choices=('total', 'queries', 'db', 'serialize', 'count'),
+            default='total',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.QUERY_PROFILER_LOG
+        views = defaultdict(list)
+        repeats = defaultdict(Counter)
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    name = record['view'] or record['path']
+                    views[name].append(record)
+                    for sql, count in record['repeated'].items():
+                        repeats[name][sql] = max(repeats[name][sql], count)
+        except FileNotFoundError:
+            raise CommandError(f'Журнал {path} не найден.')
+
+        rows = []
+        for name, records in views.items():
+            total = [r['total_ms'] for r in records]
+            sizes = [r['size'] for r in records if r['size'] is not None]
+            rows.append({
+                'view': name,
+                'count': len(records),
+                'total': sum(total) / len(total),
+                'p95': percentile(total, 0.95),
+                'queries': sum(r['queries'] for r in records) / len(records),
+                'db': sum(r['db_ms'] for r in records) / len(records),
+                'serialize': sum(
+                    r.get('serialize_ms', 0) for r in records
+                ) / len(records),
+                'render': sum(r['render_ms'] for r in records) / len(records),
+                'size': sum(sizes) / len(sizes) if sizes else 0,
+            })
+        rows.sort(key=lambda row: row[options['sort']], reverse=True)
+
+        self.stdout.write(
+            f'{"view":<40}{"вызовов":>8}{"ср, мс":>9}{"p95, мс":>9}'
+            f'{"запросов":>10}{"база, мс":>10}{"сериал., мс":>13}'
+            f'{"рендер, мс":>12}'
+            f'{"байт":>10}'
+        )
+        for row in rows:
+            self.stdout.write(
+                f'{row["view"]:<40}{row["count"]:>8}{row["total"]:>9.1f}'
+                f'{row["p95"]:>9.1f}{row["queries"]:>10.1f}'
+                f'{row["db"]:>10.1f}{row["serialize"]:>13.1f}'
+                f'{row["render"]:>12.1f}'
+                f'{row["size"]:>10.0f}'
+            )
+        for name, shapes in repeats.items():
+            self.stdout.write(self.style.WARNING(f'\nN+1 в {name}:'))
+            for sql, count in shapes.most_common(3):
+                self.stdout.write(f'  x{count}: {sql[:200]}')
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+
+class QueryCollector:
+    """Обёртка execute_wrapper: число, время и «форма» SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[sql] += 1
+
+
+def get_view_name(request):
+    match = request.resolver_match
+    if match is None:
+        return None
+    view = getattr(match.func, 'cls', match.func)
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    if action:
+        return f'{view.__name__}.{action}'
+    return view.__name__
+
+
+@contextmanager
+def profile_segment(request, name):
+    """Учесть время блока за вычетом запросов к базе в сегменте name
+    профилировщика. Без QueryProfilerMiddleware ничего не делает."""
+    segments = getattr(request, '_profiler_segments', None)
+    if segments is None:
+        yield
+        return
+    collector = request._profiler_collector
+    db_start = collector.duration
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        segments[name] += elapsed - (collector.duration - db_start)
+
+
+class QueryProfilerMiddleware:
+    """Профилирование запросов к API, включается QUERY_PROFILER = True.
+
+    Для каждого ответа считает SQL-запросы, время в базе, время
+    сериализации, время view без базы и сериализации и время рендеринга
+    ответа, добавляет их в заголовок Server-Timing и дописывает строкой
+    JSON в QUERY_PROFILER_LOG. Сериализация отмечается profile_segment():
+    представления рецептов в RecipeCache.render() и подписок; у
+    остальных view она входит во время view. Запросы
+    одной формы, повторённые не меньше QUERY_PROFILER_REPEAT раз,
+    помечаются как N+1. Сводку строит команда profile_report.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILER', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.log_path = settings.QUERY_PROFILER_LOG
+        self.repeat = getattr(settings, 'QUERY_PROFILER_REPEAT', 3)
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        request._profiler_render_start = None
+        request._profiler_collector = collector
+        request._profiler_segments = segments = Counter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(collector):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        render_start = request._profiler_render_start
+        render = time.perf_counter() - render_start if render_start else 0
+        serialize = segments['serialize']
+        view = total - collector.duration - serialize - render
+
+        repeated = {
+            sql: count for sql, count in collector.shapes.items()
+            if count >= self.repeat
+        }
+        size = None if response.streaming else len(response.content)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={collector.duration * 1000:.1f};'
+            f'desc="{collector.count} queries"',
+            f'view;dur={view * 1000:.1f}',
+            f'serialize;dur={serialize * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        if repeated:
+            response['X-Query-Repeats'] = max(repeated.values())
+        self.write({
+            'view': get_view_name(request),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_ms': round(collector.duration * 1000, 3),
+            'view_ms': round(view * 1000, 3),
+            'serialize_ms': round(serialize * 1000, 3),
+            'render_ms': round(render * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+            'size': size,
+            'repeated': repeated,
+        })
+        return response
+
+    def process_template_response(self, request, response):
+        request._profiler_render_start = time.perf_counter()
+        return response
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock, open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
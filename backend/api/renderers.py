@@ -0,0 +1,31 @@
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+
+
+class TXTRenderer(JSONRenderer):
+    """Выбирается по ?format=txt; ошибки отдаются в JSON."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(JSONRenderer):
+    """Выбирается по ?format=csv; ошибки отдаются в JSON."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class DownloadContentNegotiation(DefaultContentNegotiation):
+    """Без ?format= отдаёт файл первым рендерером, даже если Accept его
+    не допускает: фронтенд шлёт Accept: application/json."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            format_query_param = self.settings.URL_FORMAT_OVERRIDE
+            if format_suffix or request.query_params.get(format_query_param):
+                raise
+            return renderers[0], renderers[0].media_type
@@ -1,14 +1,17 @@
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 from rest_framework.serializers import ValidationError
 from rest_framework.validators import UniqueTogetherValidator
 
-from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            ShoppingCart, Tag,)
+from recipes.models import (ImageStatus, Ingredient, IngredientRecipe, Recipe,
+                            Tag, TagRecipe,)
 from users.models import Follow
+from users.relations import RelationListSerializer, get_relation_loader
 from users.serializers import CustomUserSerializer
 
+from .fields import ImageVariantsField, StreamingBase64ImageField
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -41,9 +44,11 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 
 
 class LowerRecipeSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class ReadOnlyRecipeSerializer(serializers.ModelSerializer):
@@ -57,6 +62,7 @@ class ReadOnlyRecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = serializers.ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -69,29 +75,37 @@ class ReadOnlyRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
+        list_serializer_class = RelationListSerializer
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
+    def prime_relations(self, loader, recipes):
+        loader.prime('favorites', (recipe.pk for recipe in recipes))
+        loader.prime('shopping_cart', (recipe.pk for recipe in recipes))
+        loader.prime('follows', (recipe.author_id for recipe in recipes))
 
     def get_is_favorited(self, obj):
-        request = self.context['request']
-        if request.user.is_anonymous:
-            return False
-        user = request.user.pk
-        recipe = obj.pk
-        return Favorite.objects.filter(user=user, recipe=recipe).exists()
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        loader = get_relation_loader(self.context.get('request'))
+        return loader.has('favorites', obj.pk)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context['request']
-        if request.user.is_anonymous:
-            return False
-        user = request.user.pk
-        recipe = obj.pk
-        return ShoppingCart.objects.filter(user=user, recipe=recipe).exists()
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        loader = get_relation_loader(self.context.get('request'))
+        return loader.has('shopping_cart', obj.pk)
 
 
 class RecipeSerializer(ReadOnlyRecipeSerializer):
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -104,6 +118,7 @@ class RecipeSerializer(ReadOnlyRecipeSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
@@ -112,30 +127,53 @@ class RecipeSerializer(ReadOnlyRecipeSerializer):
         tags = self.initial_data.get('tags')
         if not tags:
             raise ValidationError('Укажите хотя бы один тег.')
+        if not isinstance(tags, list):
+            raise ValidationError('Теги должны быть списком id.')
+        try:
+            tags = [int(tag) for tag in tags]
+        except (TypeError, ValueError):
+            raise ValidationError('Тег должен быть указан числовым id.')
         if len(tags) != len(set(tags)):
             raise ValidationError('Теги не должны повторяться.')
-        for tag in tags:
-            get_object_or_404(Tag, pk=tag)
+        if Tag.objects.filter(pk__in=tags).count() != len(tags):
+            raise NotFound('Тег не найден.')
         data['tags'] = tags
 
-        ingredients_list = []
         ingredients = self.initial_data.get('ingredients')
         if not ingredients:
             raise ValidationError('Укажите хотя бы один ингредиент.')
+        if not isinstance(ingredients, list):
+            raise ValidationError('Ингредиенты должны быть списком.')
+        ingredients_list = []
+        ingredient_ids = set()
         for ingredient in ingredients:
-            get_object_or_404(Ingredient, pk=ingredient['id'])
+            if not isinstance(ingredient, dict) or 'id' not in ingredient:
+                raise ValidationError(
+                    'Ингредиент указывается объектом с полями id и amount.'
+                )
             try:
-                int(ingredient['amount'])
-            except ValueError:
+                amount = int(ingredient.get('amount'))
+            except (TypeError, ValueError):
                 raise ValidationError(
                     'Количество ингредиента должно быть записано только в '
                     'виде числа.'
                 )
-            if int(ingredient['amount']) < 0:
+            if amount < 0:
                 raise ValidationError('Минимальное количество игредиента - 0.')
-            if ingredient in ingredients_list:
+            try:
+                # 5 и "5" - один и тот же ингредиент.
+                ingredient_id = int(ingredient['id'])
+            except (TypeError, ValueError):
+                raise ValidationError(
+                    'Ингредиент должен быть указан числовым id.'
+                )
+            if ingredient_id in ingredient_ids:
                 raise ValidationError('Ингредиенты не должны повторяться.')
-            ingredients_list.append(ingredient)
+            ingredient_ids.add(ingredient_id)
+            ingredients_list.append({'id': ingredient_id, 'amount': amount})
+        found = Ingredient.objects.filter(pk__in=ingredient_ids).count()
+        if found != len(ingredient_ids):
+            raise NotFound('Ингредиент не найден.')
         data['ingredients'] = ingredients_list
 
         cooking_time = self.initial_data.get('cooking_time')
@@ -144,29 +182,127 @@ class RecipeSerializer(ReadOnlyRecipeSerializer):
         return data
 
     def create_ingredients(self, recipe, ingredients):
-        for ingredient in ingredients:
-            IngredientRecipe.objects.create(
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
                 recipe=recipe,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount'),
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount'],
             )
+            for ingredient in ingredients
+        )
 
+    def create_tags(self, recipe, tags):
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag) for tag in tags
+        )
+
+    def save(self, **kwargs):
+        image = self.validated_data.get('image')
+        instance = super().save(**kwargs)
+        if image is not None:
+            # Временный файл картинки уже перенесён в MEDIA_ROOT.
+            image.close()
+        return instance
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         self.create_ingredients(recipe, ingredients)
-        recipe.tags.set(tags)
+        self.create_tags(recipe, tags)
+        Recipe.objects.filter(pk=recipe.pk).refresh_search_document()
         return recipe
 
-    def update(self, request, validated_data):
+    def update_ingredients(self, recipe, ingredients):
+        """Изменить только те строки IngredientRecipe, что отличаются."""
+        current = {
+            row.ingredient_id: row for row in recipe.ingredient_recipe.all()
+        }
+        amounts = {
+            int(ingredient['id']): ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            IngredientRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        added = amounts.keys() - current.keys()
+        if added:
+            self.create_ingredients(recipe, (
+                {'id': ingredient_id, 'amount': amounts[ingredient_id]}
+                for ingredient_id in added
+            ))
+
+    def update_tags(self, recipe, tags):
+        """Изменить только те строки TagRecipe, что отличаются."""
+        current = set(recipe.tag_recipe.values_list('tag_id', flat=True))
+        tags = {int(tag) for tag in tags}
+        if current - tags:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=current - tags
+            ).delete()
+        if tags - current:
+            self.create_tags(recipe, tags - current)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.get(pk=request.id)
-        recipe.ingredients.clear()
-        recipe.tags.set(tags)
-        self.create_ingredients(recipe, ingredients)
-        return super().update(recipe, validated_data)
+        if 'image' in validated_data:
+            validated_data['image_status'] = ImageStatus.PENDING
+        self.update_ingredients(instance, ingredients)
+        self.update_tags(instance, tags)
+        instance = super().update(instance, validated_data)
+        Recipe.objects.filter(pk=instance.pk).refresh_search_document()
+        return instance
+
+    def to_representation(self, instance):
+        instance = (
+            Recipe.objects.with_related()
+            .with_user_flags(self.context['request'].user)
+            .get(pk=instance.pk)
+        )
+        return super().to_representation(instance)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список рецептов для массового добавления или удаления."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=200,
+    )
+    clear = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if not data.get('ids') and not data['clear']:
+            raise ValidationError('Укажите ids или clear.')
+        return data
+
+
+class CookQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+    min_coverage = serializers.FloatField(
+        min_value=0, max_value=1, default=0.5
+    )
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -191,16 +327,25 @@ class FollowSerializer(serializers.ModelSerializer):
             'recipes_count',
         )
         model = Follow
+        list_serializer_class = RelationListSerializer
+
+    def prime_relations(self, loader, follows):
+        loader.prime('follows', (follow.user_id for follow in follows))
 
     def get_is_subscribed(self, obj):
-        user = obj.user
-        follower = self.context.get('request').user
-        return Follow.objects.filter(user=user, follower=follower).exists()
+        request = self.context.get('request')
+        if obj.follower_id == request.user.id:
+            return True
+        return get_relation_loader(request).has('follows', obj.user_id)
 
     def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj.user)
+        recipes = getattr(obj.user, 'feed_recipes', None)
+        if recipes is None:
+            recipes = Recipe.objects.filter(author=obj.user)
         serializer = LowerRecipeSerializer(recipes, many=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj.user).count()
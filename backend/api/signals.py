@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag, TagRecipe
+from recipes.signals import catalog_changed
+from users.models import User
+
+from .cache import ingredient_catalog, recipe_cache, tag_catalog
+
+CATALOGS = {
+    Tag: tag_catalog,
+    Ingredient: ingredient_catalog,
+}
+RECIPE_LOOKUPS = {
+    Tag: 'tag_recipe__tag',
+    Ingredient: 'ingredient_recipe__ingredient',
+}
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(catalog_changed)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(CATALOGS[sender].invalidate)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_catalog_recipes(sender, instance, created=False, **kwargs):
+    """Название и цвет тега, название и единицы ингредиента входят в
+    представление рецепта: отмечаем изменёнными рецепты, где они есть."""
+    if created:
+        return
+    Recipe.objects.filter(**{RECIPE_LOOKUPS[sender]: instance}).touch()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    recipe_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_save, sender=TagRecipe)
+def invalidate_recipe_relation(sender, instance, **kwargs):
+    recipe_cache.invalidate(instance.recipe_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, created, update_fields,
+                              **kwargs):
+    """Профиль автора входит в представление его рецептов. Вход в систему
+    меняет только last_login и рецепты не трогает."""
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    recipe_cache.invalidate_author(instance.pk)
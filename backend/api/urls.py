@@ -2,7 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (IngredientViewSet, RecipeViewSet, TagViewSet, favorite,
-                    shopping_cart,)
+                    favorite_bulk, shopping_cart, shopping_cart_bulk,)
 
 router = DefaultRouter()
 router.register(r'ingredients', IngredientViewSet)
@@ -10,6 +10,11 @@ router.register(r'recipes', RecipeViewSet)
 router.register(r'tags', TagViewSet)
 
 urlpatterns = [
+    path('recipes/favorite/', favorite_bulk, name='favorite_bulk'),
+    path(
+        'recipes/shopping_cart/', shopping_cart_bulk,
+        name='shopping_cart_bulk',
+    ),
     path('', include(router.urls)),
     path('recipes/<int:pk>/favorite/', favorite, name='favorite'),
     path(
@@ -1,25 +1,66 @@
-from collections import defaultdict
+import csv
 
-from django.http import HttpResponse
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
 
 from recipes.models import IngredientRecipe
 
 
-def create_txt(request):
-    """Скачать список покупок в txt."""
-    response = HttpResponse(content_type='text/plain')
-    response['Content-Disposition'] = 'attachment; filename=ingredients.txt'
-    user = request.user
-    ingredients = IngredientRecipe.objects.filter(
-        recipe__shopping_cart__user=user
+class Echo:
+    """Буфер для csv.writer, который возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def get_shopping_list(user):
+    """Суммарное количество ингредиентов из списка покупок, одним запросом."""
+    return (
+        IngredientRecipe.objects.filter(recipe__shopping_cart__user=user)
+        .values('ingredient__name', 'ingredient__measurement_unit')
+        .annotate(amount=Sum('amount'))
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
+
+
+def iter_txt(ingredients):
+    empty = True
+    for item in ingredients.iterator():
+        if empty:
+            yield 'Ваш список покупок: \n'
+            empty = False
+        yield (
+            f'{item["ingredient__name"]} '
+            f'({item["ingredient__measurement_unit"]}) - {item["amount"]}\n'
+        )
+    if empty:
+        yield 'Ваш список покупок пуст.'
+
+
+def iter_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единицы измерения', 'Количество'))
+    for item in ingredients.iterator():
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['amount'],
+        ))
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (iter_txt, 'text/plain; charset=utf-8'),
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+}
+
+
+def create_shopping_list(request, file_format='txt'):
+    """Скачать список покупок в txt или csv."""
+    iterator, content_type = SHOPPING_LIST_FORMATS[file_format]
+    response = StreamingHttpResponse(
+        iterator(get_shopping_list(request.user)), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename=ingredients.{file_format}'
     )
-    if not ingredients:
-        response.writelines('Ваш список покупок пуст.')
-        return response
-    listing = defaultdict(int)
-    for i in ingredients:
-        listing[i.ingredient] += i.amount
-    listing = [f'{k} - {v}' + '\n' for k, v in listing.items()]
-    listing = ['Ваш список покупок: \n'] + listing
-    response.writelines(listing)
     return response
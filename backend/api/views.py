@@ -1,88 +1,225 @@
-from django.shortcuts import get_object_or_404
+from django.db import IntegrityError, transaction
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.serializers import ValidationError
 
+from recipes.matching import ingredient_index
 from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.recommendations import recommended_recipes, similar_recipes
 
-from .filters import IngredientSearchFilter, RecipeFilter
+from .cache import (CachedCatalogMixin, ingredient_catalog, recipe_cache,
+                    tag_catalog,)
+from .etags import conditional_response, recipes_etag
+from .filters import (IngredientSearchFilter, RecipeFilter,
+                      RecipeOrderingFilter, RecipeSearchFilter,)
+from .pagination import RankedPagination
 from .permissions import AuthorOrReadOnly
-from .serializers import (IngredientSerializer, LowerRecipeSerializer,
-                          ReadOnlyRecipeSerializer, RecipeSerializer,
+from .renderers import CSVRenderer, DownloadContentNegotiation, TXTRenderer
+from .serializers import (CookQuerySerializer, IngredientSerializer,
+                          LowerRecipeSerializer, ReadOnlyRecipeSerializer,
+                          RecipeIdsSerializer, RecipeSerializer,
                           TagSerializer,)
-from .utility import create_txt
+from .utility import create_shopping_list
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
+    catalog = ingredient_catalog
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
+    catalog = tag_catalog
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
+def add_score(data, item):
+    data['score'] = round(item[1], 4)
+
+
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (
+        DjangoFilterBackend, RecipeSearchFilter, RecipeOrderingFilter
+    )
     filterset_class = RecipeFilter
     permission_classes = (AuthorOrReadOnly,)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in (
+            'retrieve', 'list', 'cook', 'similar', 'recommended'
+        ):
+            # Теги и ингредиенты подгружаются только после проверки ETag
+            # и только для рецептов, которых нет в recipe_cache.
+            return queryset.select_related('author').with_user_flags(
+                self.request.user
+            )
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ('retrieve', 'list'):
             return ReadOnlyRecipeSerializer
         return super().get_serializer_class()
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        envelope = None
+        if page is None:
+            page = list(queryset)
+        else:
+            envelope = self.paginator.get_paginated_response([]).data
+
+        def build():
+            data = recipe_cache.render(page, request)
+            if envelope is None:
+                return Response(data)
+            return self.get_paginated_response(data)
+
+        etag = recipes_etag(request, page, envelope)
+        return conditional_response(request, etag, build)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+
+        def build():
+            return Response(recipe_cache.render([instance], request)[0])
+
+        etag = recipes_etag(request, [instance])
+        return conditional_response(request, etag, build)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def ranked_response(self, request, ranked, decorate, on_missing=None):
+        """Страница рецептов из списка, упорядоченного в памяти.
+
+        Элементы ranked начинаются с id рецепта, decorate(data, item)
+        дополняет представление рецепта. Id уже удалённых рецептов
+        передаются в on_missing.
+        """
+        paginator = RankedPagination()
+        page = paginator.paginate_queryset(ranked, request, self)
+        recipes = self.get_queryset().in_bulk([item[0] for item in page])
+        missing = [item[0] for item in page if item[0] not in recipes]
+        if missing and on_missing is not None:
+            on_missing(*missing)
+        page = [item for item in page if item[0] in recipes]
+        page_recipes = [recipes[item[0]] for item in page]
+        envelope = paginator.get_paginated_response([]).data
+
+        def build():
+            data = recipe_cache.render(page_recipes, request)
+            for recipe_data, item in zip(data, page):
+                decorate(recipe_data, item)
+            return paginator.get_paginated_response(data)
+
+        etag = recipes_etag(request, page_recipes, envelope)
+        return conditional_response(request, etag, build)
+
+    @action(detail=False)
+    def cook(self, request):
+        """Рецепты из имеющихся ингредиентов (?ingredients=), где они
+        покрывают не меньше ?min_coverage= ингредиентов рецепта."""
+        params = CookQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        available = set(params.validated_data['ingredients'])
+        matches = ingredient_index.match(
+            available, params.validated_data['min_coverage']
+        )
+
+        def decorate(data, match):
+            data['coverage'] = round(match.coverage, 3)
+            data['missing_ingredients'] = ingredient_index.missing(
+                match.recipe_id, available
+            )
+
+        return self.ranked_response(
+            request, matches, decorate, ingredient_index.discard
+        )
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Рецепты, которые чаще всего добавляют в избранное вместе с
+        этим."""
+        recipe = self.get_object()
+        return self.ranked_response(
+            request, similar_recipes(recipe.pk), add_score
+        )
+
     @action(detail=False, permission_classes=[permissions.IsAuthenticated])
+    def recommended(self, request):
+        """Рецепты, похожие на избранное пользователя."""
+        return self.ranked_response(
+            request, recommended_recipes(request.user), add_score
+        )
+
+    @action(detail=False, permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """Статистика кеша представлений рецептов текущего процесса."""
+        return Response(recipe_cache.get_stats())
+
+    @action(
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[TXTRenderer, CSVRenderer],
+        content_negotiation_class=DownloadContentNegotiation,
+    )
     def download_shopping_cart(self, request):
-        return create_txt(request)
+        return create_shopping_list(request, request.accepted_renderer.format)
+
+
+ALREADY_ADDED = {
+    Favorite: 'Рецепт уже есть в избранном.',
+    ShoppingCart: 'Рецепт уже есть в списке покупок.',
+}
+NOT_ADDED = {
+    Favorite: 'Рецепта нет в избранном.',
+    ShoppingCart: 'Рецепта нет в списке покупок.',
+}
 
 
 def add_recipe(model, user, pk):
-    recipe = get_object_or_404(Recipe, pk=pk)
-    if model.objects.filter(user=user, recipe=recipe).exists():
-        if model.__name__ == 'Favorite':
-            return Response(
-                {'errors': 'Рецепт уже есть в избранном.'},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        elif model.__name__ == 'ShoppingCart':
-            return Response(
-                {'errors': 'Рецепт уже есть в списке покупок.'},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-    else:
-        model.objects.create(user=user, recipe=recipe)
-        serializer = LowerRecipeSerializer(recipe)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    """Добавить рецепт без предварительных проверок: отсутствие рецепта
+    видно по UPDATE счётчика в save(), повторное добавление - по
+    уникальному ограничению."""
+    try:
+        with transaction.atomic():
+            model.objects.create(user=user, recipe_id=pk)
+    except Recipe.DoesNotExist:
+        raise Http404
+    except IntegrityError:
+        return Response(
+            {'errors': ALREADY_ADDED[model]},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    serializer = LowerRecipeSerializer(Recipe.objects.get(pk=pk))
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 def del_recipe(model, user, pk):
-    recipe = get_object_or_404(Recipe, pk=pk)
-    if model.objects.filter(user=user, recipe=recipe).exists():
-        model.objects.filter(user=user, recipe=recipe).delete()
+    """Удалить рецепт одним DELETE; число удалённых строк решает ответ."""
+    with transaction.atomic():
+        deleted, _ = model.objects.filter(user=user, recipe_id=pk).delete()
+        if deleted:
+            Recipe.objects.filter(pk=pk).change_counter(model, -1)
+    if deleted:
         return Response(status=status.HTTP_204_NO_CONTENT)
-    else:
-        if model.__name__ == 'Favorite':
-            return Response(
-                {'errors': 'Рецепта нет в избранном.'},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        elif model.__name__ == 'ShoppingCart':
-            return Response(
-                {'errors': 'Рецепта нет в списке покупок.'},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    if not Recipe.objects.filter(pk=pk).exists():
+        raise Http404
+    return Response(
+        {'errors': NOT_ADDED[model]},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
 
 
 @api_view(['POST', 'DELETE'])
@@ -101,3 +238,65 @@ def shopping_cart(request, pk):
         return add_recipe(ShoppingCart, request.user, pk)
     elif request.method == 'DELETE':
         return del_recipe(ShoppingCart, request.user, pk)
+
+
+def bulk_add_recipes(model, user, ids):
+    """Добавить несколько рецептов: одна выборка существующих рецептов и
+    один INSERT, который пропускает уже добавленные."""
+    with transaction.atomic():
+        found = set(
+            Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        added = model.objects.add_missing(user, sorted(found))
+    statuses = {pk: 'exists' for pk in found}
+    statuses.update({pk: 'added' for pk in added})
+    return [{'id': pk, 'status': statuses.get(pk, 'not_found')} for pk in ids]
+
+
+def bulk_del_recipes(model, user, ids=None):
+    """Удалить несколько рецептов или, если ids не указаны, все."""
+    rows = model.objects.filter(user=user)
+    if ids is not None:
+        rows = rows.filter(recipe_id__in=ids)
+    with transaction.atomic():
+        removed = set(
+            rows.select_for_update().values_list('recipe_id', flat=True)
+        )
+        if removed:
+            rows.filter(recipe_id__in=removed).delete()
+            Recipe.objects.filter(pk__in=removed).change_counter(model, -1)
+    if ids is None:
+        ids = sorted(removed)
+    return [
+        {'id': pk, 'status': 'removed' if pk in removed else 'absent'}
+        for pk in ids
+    ]
+
+
+def bulk_recipes(model, request):
+    serializer = RecipeIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data.get('ids')
+    if ids is not None:
+        ids = list(dict.fromkeys(ids))
+    if request.method == 'POST':
+        if ids is None:
+            raise ValidationError({'ids': ['Укажите рецепты для добавления.']})
+        results = bulk_add_recipes(model, request.user, ids)
+    else:
+        if serializer.validated_data['clear']:
+            ids = None
+        results = bulk_del_recipes(model, request.user, ids)
+    return Response({'results': results})
+
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def favorite_bulk(request):
+    return bulk_recipes(Favorite, request)
+
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def shopping_cart_bulk(request):
+    return bulk_recipes(ShoppingCart, request)
@@ -25,9 +25,9 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'users',
-    'recipes',
-    'api',
+    'users.apps.UsersConfig',
+    'recipes.apps.FoodConfig',
+    'api.apps.ApiConfig',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -87,6 +88,16 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -137,7 +148,7 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -146,6 +157,27 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+QUERY_PROFILER = os.getenv('QUERY_PROFILER', default='False') == 'True'
+QUERY_PROFILER_LOG = os.getenv(
+    'QUERY_PROFILER_LOG', default=os.path.join(BASE_DIR, 'profiler.log')
+)
+QUERY_PROFILER_REPEAT = 3
+
+# Кеш токенов сбрасывается при save(), удалении и QuerySet.update()
+# пользователя. После правки таблицы пользователей сырым SQL старые данные
+# пользователя могут отдаваться до TOKEN_CACHE_TIMEOUT секунд.
+TOKEN_CACHE_TIMEOUT = 300
+TOKEN_CACHE_LOCAL_TIMEOUT = 30
+TOKEN_CACHE_LOCAL_SIZE = 1024
+
+RECIPE_CACHE_SIZE = 2048
+RECIPE_NEIGHBOURS = 20
+
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+RECIPE_IMAGE_MAX_SIDE = 6000
+RECIPE_IMAGE_VARIANTS = {'small': 320, 'medium': 960}
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+
 DJOSER = {
     'HIDE_USERS': False,
     'SERIALIZERS': {
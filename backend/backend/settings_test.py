@@ -0,0 +1,24 @@
+"""Настройки pytest: SQLite в файле, чтобы потоки одного теста видели
+общую базу, отдельный каталог для картинок и быстрый хеш паролей."""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(tempfile.gettempdir(), 'foodgram.sqlite3'),
+        'TEST': {
+            'NAME': os.path.join(
+                tempfile.gettempdir(), 'foodgram_test.sqlite3'
+            ),
+        },
+    }
+}
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-media-')
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+QUERY_PROFILER = False
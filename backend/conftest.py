@@ -0,0 +1,83 @@
+import io
+from collections import namedtuple
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from api.cache import recipe_cache
+from recipes.models import Ingredient, Tag
+from recipes.recommendations import rebuild
+from recipes.synthetic import generate
+from users.models import Follow, User
+
+# Объём синтетических данных, на которых проверяются потолки запросов.
+USERS = 2000
+RECIPES = 20000
+PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+Dataset = namedtuple(
+    'Dataset', ('user_ids', 'recipe_ids', 'user_id', 'author_id', 'tag')
+)
+
+
+@pytest.fixture(scope='session')
+def dataset(django_db_setup, django_db_blocker):
+    """Каталог ингредиентов из recipes/data и синтетические пользователи,
+    рецепты, подписки, избранное и списки покупок."""
+    with django_db_blocker.unblock():
+        call_command('importdata', 'ingredients', stdout=io.StringIO())
+        user_ids, recipe_ids = generate(
+            users=USERS, recipes=RECIPES, seed=0, prefix='test'
+        )
+        rebuild()
+        user_id = user_ids[0]
+        author_id = (
+            Follow.objects.filter(follower_id=user_id)
+            .values_list('user_id', flat=True).first()
+        )
+        return Dataset(
+            user_ids, recipe_ids, user_id, author_id, Tag.objects.first()
+        )
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Кеши процесса не переносят данные между тестами."""
+    cache.clear()
+    recipe_cache.clear()
+    yield
+    cache.clear()
+    recipe_cache.clear()
+
+
+@pytest.fixture
+def user(dataset, db):
+    return User.objects.get(pk=dataset.user_id)
+
+
+@pytest.fixture
+def anon_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def payload(dataset):
+    """Тело запроса на создание рецепта с 30 ингредиентами."""
+    ingredient_ids = Ingredient.objects.values_list('pk', flat=True)[:30]
+    return {
+        'name': 'Замер', 'text': 'Текст', 'cooking_time': 10,
+        'image': PNG, 'tags': [dataset.tag.pk],
+        'ingredients': [{'id': pk, 'amount': 10} for pk in ingredient_ids],
+    }
@@ -1,7 +1,61 @@
-from django.contrib import admin
+from collections import Counter, defaultdict
 
-from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                     ShoppingCart, Tag, TagRecipe,)
+from django.contrib import admin
+from django.db import transaction
+
+from .models import (Favorite, ImageStatus, Ingredient, IngredientRecipe,
+                     Recipe, ShoppingCart, Tag, TagRecipe,)
+
+
+class TouchRecipeMixin:
+    """Обновляет дату изменения рецепта при правке его ингредиентов и
+    тегов не через форму самого рецепта."""
+
+    def recipes_changed(self, *pks):
+        recipes = Recipe.objects.filter(pk__in=pks)
+        recipes.touch()
+        recipes.refresh_search_document()
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.recipes_changed(obj.recipe_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.recipes_changed(obj.recipe_id)
+
+    def delete_queryset(self, request, queryset):
+        pks = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self.recipes_changed(*pks)
+
+
+class RecipeCounterAdminMixin:
+    """Поддерживает счётчики добавлений рецептов при правке избранного и
+    списков покупок в админке. Добавление и удаление одной записи
+    меняют счётчик в save() и delete() модели."""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'recipe' in form.changed_data:
+            model = type(obj)
+            Recipe.objects.filter(pk=form.initial['recipe']).change_counter(
+                model, -1
+            )
+            Recipe.objects.filter(pk=obj.recipe_id).change_counter(model, 1)
+
+    def delete_queryset(self, request, queryset):
+        by_count = defaultdict(list)
+        for pk, count in Counter(
+            queryset.values_list('recipe_id', flat=True)
+        ).items():
+            by_count[count].append(pk)
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            for count, pks in by_count.items():
+                Recipe.objects.filter(pk__in=pks).change_counter(
+                    queryset.model, -count
+                )
 
 
 class IngredientRecipeInline(admin.TabularInline):
@@ -18,19 +72,33 @@ class TagRecipeInline(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientRecipeInline, TagRecipeInline)
-    list_display = ('id', 'author', 'name', 'favorite_count')
+    list_display = (
+        'id', 'author', 'name', 'favorites_count', 'in_carts_count'
+    )
     list_filter = ('author', 'name', 'tags')
     ordering = ('-id',)
     search_fields = ('name',)
     autocomplete_fields = ('author',)
+    readonly_fields = (
+        'favorites_count', 'in_carts_count', 'image_status', 'updated_at'
+    )
 
-    def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+    def save_model(self, request, obj, form, change):
+        if 'image' in form.changed_data:
+            obj.image_status = ImageStatus.PENDING
+        super().save_model(request, obj, form, change)
 
-    favorite_count.short_description = 'Количество добавлений в избранное'
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Recipe.objects.filter(pk=form.instance.pk).refresh_search_document()
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
 
-class IngredientRecipeIAdmin(admin.ModelAdmin):
+
+class IngredientRecipeIAdmin(TouchRecipeMixin, admin.ModelAdmin):
     list_display = ('ingredient', 'recipe', 'amount')
     list_filter = ('recipe',)
     autocomplete_fields = ('ingredient', 'recipe',)
@@ -42,13 +110,13 @@ class IngredientIAdmin(admin.ModelAdmin):
     list_filter = ('name',)
 
 
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(RecipeCounterAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe')
     list_filter = ('user', 'recipe')
     autocomplete_fields = ('user', 'recipe',)
 
 
-class TagRecipeAdmin(admin.ModelAdmin):
+class TagRecipeAdmin(TouchRecipeMixin, admin.ModelAdmin):
     list_display = ('tag', 'recipe')
     list_filter = ('tag', 'recipe')
     autocomplete_fields = ('recipe',)
@@ -58,8 +126,16 @@ class TagAdmin(admin.ModelAdmin):
     inlines = (TagRecipeInline,)
     list_display = ('name', 'slug')
 
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        Recipe.objects.filter(pk__in=[
+            *(obj.recipe_id for obj in formset.new_objects),
+            *(obj.recipe_id for obj, _ in formset.changed_objects),
+            *(obj.recipe_id for obj in formset.deleted_objects),
+        ]).touch()
+
 
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(RecipeCounterAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe')
     list_filter = ('user', 'recipe')
     autocomplete_fields = ('user', 'recipe',)
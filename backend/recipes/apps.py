@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class FoodConfig(AppConfig):
     name = 'recipes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,78 @@
+"""Слияние ингредиентов с одинаковыми названием и единицей измерения.
+
+Ограничение unique_ingredient_measurement_unit не применится к базе, где
+такие дубли уже есть, поэтому они сливаются перед migrate, см.
+recipes.signals, или командой merge_ingredients. Функции принимают
+модели параметрами, чтобы работать и с историческими моделями миграций.
+"""
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+
+
+def duplicate_groups(ingredient_model, using=DEFAULT_DB_ALIAS):
+    """Группы дублей: название, единица измерения и id ингредиента,
+    который остаётся."""
+    return (
+        ingredient_model.objects.using(using).order_by()
+        .values('name', 'measurement_unit')
+        .annotate(keep=Min('pk'), total=Count('pk'))
+        .filter(total__gt=1)
+    )
+
+
+def merge_group(ingredient_model, ingredient_recipe_model, group, using):
+    """Перенести строки IngredientRecipe дублей на оставшийся ингредиент
+    и удалить дубли; вернуть id затронутых рецептов."""
+    keep = group['keep']
+    ingredients = ingredient_model.objects.using(using)
+    duplicates = list(
+        ingredients.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(pk=keep).values_list('pk', flat=True)
+    )
+    rows = ingredient_recipe_model.objects.using(using).filter(
+        ingredient__in=[keep, *duplicates]
+    )
+    recipe_ids = set(
+        rows.filter(ingredient__in=duplicates)
+        .values_list('recipe', flat=True)
+    )
+    # Рецепт с несколькими дублями получает одну строку с суммой.
+    for collision in (
+        rows.order_by().values('recipe')
+        .annotate(first=Min('pk'), amount=Sum('amount'), total=Count('pk'))
+        .filter(total__gt=1)
+    ):
+        rows.filter(recipe=collision['recipe']).exclude(
+            pk=collision['first']
+        ).delete()
+        rows.filter(pk=collision['first']).update(
+            ingredient=keep, amount=collision['amount']
+        )
+    rows.filter(ingredient__in=duplicates).update(ingredient=keep)
+    ingredients.filter(pk__in=duplicates).delete()
+    return recipe_ids
+
+
+def merge_duplicate_ingredients(ingredient_model, ingredient_recipe_model,
+                                recipe_model, using=DEFAULT_DB_ALIAS):
+    """Слить дубли ингредиентов в ингредиент с меньшим id; вернуть число
+    удалённых дублей и число затронутых рецептов."""
+    merged = 0
+    recipe_ids = set()
+    with transaction.atomic(using=using):
+        for group in list(duplicate_groups(ingredient_model, using)):
+            recipe_ids |= merge_group(
+                ingredient_model, ingredient_recipe_model, group, using
+            )
+            merged += group['total'] - 1
+        field_names = {
+            field.name for field in recipe_model._meta.get_fields()
+        }
+        if recipe_ids and 'updated_at' in field_names:
+            # Индекс подбора по ингредиентам дочитывает рецепты по дате.
+            recipe_model.objects.using(using).filter(
+                pk__in=recipe_ids
+            ).update(updated_at=timezone.now())
+    return merged, len(recipe_ids)
@@ -0,0 +1,93 @@
+"""Уменьшенные копии картинок рецептов.
+
+Очередью служит сама таблица рецептов: рецепт с image_status=PENDING
+ждёт обработки. Копии кладутся в recipes/variants/ под именами из хеша
+оригинала и размера, поэтому ссылки на них строятся без обращения к
+хранилищу, а готовые копии общей картинки не строятся повторно.
+"""
+import io
+import multiprocessing
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.utils import timezone
+from PIL import Image, features
+
+from .models import ImageStatus, Recipe
+from .storage import recipe_image_storage
+
+IMAGE_VARIANTS = getattr(
+    settings, 'RECIPE_IMAGE_VARIANTS', {'small': 320, 'medium': 960}
+)
+VARIANTS_DIR = 'recipes/variants'
+if features.check('webp'):
+    VARIANT_FORMAT, VARIANT_EXTENSION = 'WEBP', 'webp'
+else:
+    VARIANT_FORMAT, VARIANT_EXTENSION = 'JPEG', 'jpg'
+VARIANT_QUALITY = 80
+
+
+def variant_names(name):
+    """Имена уменьшенных копий картинки name по размерам."""
+    stem = PurePosixPath(name).stem
+    return {
+        variant: f'{VARIANTS_DIR}/{stem}_{side}.{VARIANT_EXTENSION}'
+        for variant, side in IMAGE_VARIANTS.items()
+    }
+
+
+def make_variants(name):
+    """Построить уменьшенные копии картинки; вернуть новый статус."""
+    names = variant_names(name)
+    if all(default_storage.exists(variant) for variant in names.values()):
+        return ImageStatus.READY
+    largest = max(IMAGE_VARIANTS.values())
+    try:
+        with recipe_image_storage.open(name) as file:
+            with Image.open(file) as image:
+                image.draft('RGB', (largest, largest))
+                has_alpha = VARIANT_FORMAT == 'WEBP' and (
+                    image.mode in ('RGBA', 'LA', 'PA')
+                    or 'transparency' in image.info
+                )
+                resized = image.convert('RGBA' if has_alpha else 'RGB')
+        for variant, side in sorted(
+            IMAGE_VARIANTS.items(), key=lambda item: -item[1]
+        ):
+            resized.thumbnail((side, side))
+            buffer = io.BytesIO()
+            resized.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY)
+            default_storage.delete(names[variant])
+            default_storage.save(names[variant], ContentFile(buffer.getvalue()))
+    except (OSError, Image.DecompressionBombError):
+        return ImageStatus.ORIGINAL
+    return ImageStatus.READY
+
+
+def process_pending(batch_size=100, workers=1):
+    """Обработать до batch_size рецептов из очереди; вернуть их число.
+
+    Статус меняется, только если картинка не сменилась за время обработки.
+    """
+    pending = list(
+        Recipe.objects.filter(image_status=ImageStatus.PENDING)
+        .order_by('id').values_list('pk', 'image')[:batch_size]
+    )
+    if not pending:
+        return 0
+    names = [name for _, name in pending]
+    if workers > 1:
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(workers, initializer=connections.close_all) as pool:
+            statuses = pool.map(make_variants, names)
+    else:
+        statuses = [make_variants(name) for name in names]
+    for (pk, name), status in zip(pending, statuses):
+        Recipe.objects.filter(
+            pk=pk, image=name, image_status=ImageStatus.PENDING
+        ).update(image_status=status, updated_at=timezone.now())
+    return len(pending)
@@ -0,0 +1,63 @@
+import posixpath
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import VARIANTS_DIR, variant_names
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+
+RECIPE_IMAGES_DIR = 'recipes'
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки рецептов и их уменьшенные копии, на которые не '
+        'ссылается ни один рецепт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='не трогать файлы моложе стольких секунд',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='только показать, что было бы удалено',
+        )
+
+    def handle(self, *args, **options):
+        references = Counter(
+            Recipe.objects.exclude(image='').values_list('image', flat=True)
+        )
+        used = set(references)
+        for name in references:
+            used.update(variant_names(name).values())
+        shared = sum(1 for count in references.values() if count > 1)
+        self.stdout.write(
+            f'Файлов в рецептах: {len(references)}, '
+            f'из них общих для нескольких рецептов: {shared}'
+        )
+
+        storage = recipe_image_storage
+        now = timezone.now()
+        removed = freed = 0
+        for directory in (RECIPE_IMAGES_DIR, VARIANTS_DIR):
+            if not storage.exists(directory):
+                continue
+            for file_name in storage.listdir(directory)[1]:
+                name = posixpath.join(directory, file_name)
+                if name in used:
+                    continue
+                age = now - storage.get_modified_time(name)
+                if age.total_seconds() < options['min_age']:
+                    continue
+                freed += storage.size(name)
+                removed += 1
+                if not options['dry_run']:
+                    storage.delete(name)
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов: {removed}, {freed / 1024 / 1024:.1f} МБ'
+        ))
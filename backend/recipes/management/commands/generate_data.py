@@ -0,0 +1,70 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from recipes.models import Ingredient
+from recipes.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Синтетические пользователи, рецепты, подписки, избранное и '
+        'списки покупок для нагрузочных замеров. Результат определяется '
+        '--seed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='среднее число ингредиентов в рецепте',
+        )
+        parser.add_argument(
+            '--follows', type=int, default=5,
+            help='среднее число подписок пользователя',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=10,
+            help='среднее число рецептов в избранном',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=3,
+            help='среднее число рецептов в списке покупок',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', type=str, default='synthetic',
+            help='префикс имён и email создаваемых пользователей',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='процессов для вставки строк рецептов',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if not Ingredient.objects.exists():
+            call_command('importdata', 'ingredients', stdout=self.stdout)
+
+        def log(message):
+            self.stdout.write(
+                f'[{time.perf_counter() - start:7.1f} с] {message}'
+            )
+
+        generate(
+            users=options['users'],
+            recipes=options['recipes'],
+            follows=options['follows'],
+            favorites=options['favorites'],
+            carts=options['carts'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            log=log,
+        )
+        log(self.style.SUCCESS('Готово.'))
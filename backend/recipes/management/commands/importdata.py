@@ -0,0 +1,137 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Ingredient, Tag
+from recipes.signals import catalog_changed
+from users.models import User
+
+DEFAULT_PATHS = {
+    'ingredients': os.path.join(
+        settings.BASE_DIR, 'recipes', 'data', 'ingredients.csv'
+    ),
+}
+
+
+def prepare_user(row):
+    """Пароль из файла хешируется, если он ещё не хеш.
+
+    Пользователь без пароля получает непригодный для входа пароль.
+    """
+    password = row.get('password') or None
+    if password is None:
+        row['password'] = make_password(None)
+        return row
+    try:
+        identify_hasher(password)
+    except ValueError:
+        row['password'] = make_password(password)
+    return row
+
+
+MODELS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit'), None),
+    'tags': (Tag, ('name', 'color', 'slug'), None),
+    'users': (
+        User,
+        ('email', 'username', 'first_name', 'last_name', 'password'),
+        prepare_user,
+    ),
+}
+
+
+def read_csv(path, fields):
+    """Строки csv без заголовка, столбцы в порядке fields."""
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            if row:
+                yield dict(zip(fields, row))
+
+
+def read_json(path, fields, chunk_size=64 * 1024):
+    """Объекты из json-массива, читая файл кусками."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            raise CommandError('Ожидается json-массив объектов.')
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise CommandError('Json-файл оборван.')
+                buffer += chunk
+                continue
+            yield {field: item[field] for field in fields if field in item}
+            buffer = buffer[end:]
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Идемпотентная загрузка ингредиентов, тегов или пользователей из '
+        'csv (без заголовка) или json. Уже существующие записи '
+        'пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=MODELS)
+        parser.add_argument(
+            '--path', type=str,
+            help='путь к csv или json; для ингредиентов по умолчанию '
+                 'recipes/data/ingredients.csv',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        model, fields, prepare = MODELS[options['model']]
+        path = options['path'] or DEFAULT_PATHS.get(options['model'])
+        if not path:
+            raise CommandError('Укажите --path.')
+        if path.endswith('.json'):
+            rows = read_json(path, fields)
+        else:
+            rows = read_csv(path, fields)
+
+        start = time.perf_counter()
+        total = 0
+        with transaction.atomic():
+            before = model.objects.count()
+            for chunk in chunks(rows, options['batch_size']):
+                if prepare is not None:
+                    chunk = [prepare(row) for row in chunk]
+                model.objects.bulk_create(
+                    [model(**row) for row in chunk], ignore_conflicts=True
+                )
+                total += len(chunk)
+            created = model.objects.count() - before
+        elapsed = time.perf_counter() - start
+
+        if model in (Ingredient, Tag):
+            catalog_changed.send(sender=model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {total}, добавлено {created}, '
+            f'пропущено {total - created} за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с).'
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from recipes.duplicates import duplicate_groups, merge_duplicate_ingredients
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from recipes.signals import catalog_changed
+
+
+class Command(BaseCommand):
+    help = (
+        'Слить ингредиенты с одинаковыми названием и единицей измерения: '
+        'строки рецептов переносятся на ингредиент с меньшим id. migrate '
+        'делает это сам перед миграциями приложения recipes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='только показать число групп дублей',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.stdout.write(
+                f'Групп дублей: {duplicate_groups(Ingredient).count()}'
+            )
+            return
+        merged, recipes = merge_duplicate_ingredients(
+            Ingredient, IngredientRecipe, Recipe
+        )
+        if merged:
+            catalog_changed.send(sender=Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено дублей: {merged}, затронуто рецептов: {recipes}'
+        ))
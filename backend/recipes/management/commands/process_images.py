@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные копии картинок рецептов, ожидающих обработки. '
+        'С --loop работает постоянно, опрашивая очередь.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='процессов для обработки картинок',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='не завершаться, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='пауза между опросами пустой очереди, с',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_pending(
+                options['batch_size'], options['workers']
+            )
+            total += processed
+            if processed:
+                self.stdout.write(f'Обработано картинок: {total}')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Готово: {total}'))
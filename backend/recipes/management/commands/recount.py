@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.search import search_document_expression
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитать счётчики favorites_count и in_carts_count и поисковые '
+        'документы рецептов одним UPDATE на каждое поле.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='только показать число рецептов с неверными значениями',
+        )
+
+    def actual(self, model):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(recipe=OuterRef('pk'))
+                .order_by().values('recipe')
+                .annotate(total=Count('pk')).values('total'),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+
+    def fields(self):
+        for model in (Favorite, ShoppingCart):
+            yield model.recipe_counter, self.actual(model)
+        yield 'search_document', search_document_expression()
+
+    def handle(self, *args, **options):
+        for field, actual in self.fields():
+            stale = Recipe.objects.filter(~Q(**{field: actual}))
+            if options['check']:
+                self.stdout.write(f'{field}: неверных {stale.count()}')
+                continue
+            changes = {field: actual}
+            if field == Favorite.recipe_counter:
+                # Избранное менялось в обход API: соседей нужно пересчитать.
+                changes['neighbours_stale'] = True
+            updated = stale.update(**changes)
+            self.stdout.write(self.style.SUCCESS(
+                f'{field}: исправлено {updated}'
+            ))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.recommendations import rebuild, refresh
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие рецепты по совместным добавлениям в '
+        'избранное. По умолчанию обходит только рецепты, избранное которых '
+        'изменилось; с --full пересчитывает все. С --loop работает '
+        'постоянно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='пересчитать соседей всех рецептов',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='не завершаться, когда изменений нет',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=60,
+            help='пауза между проверками изменений, с',
+        )
+
+    def handle(self, *args, **options):
+        if options['full']:
+            start = time.perf_counter()
+            recipes = rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Рецептов с соседями: {recipes} за '
+                f'{time.perf_counter() - start:.1f} с'
+            ))
+            if not options['loop']:
+                return
+        total = 0
+        while True:
+            processed = refresh(options['batch_size'])
+            total += processed
+            if processed:
+                self.stdout.write(f'Пересчитано рецептов: {total}')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Готово: {total}'))
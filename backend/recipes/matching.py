@@ -0,0 +1,143 @@
+"""Подбор рецептов по ингредиентам, которые есть у пользователя.
+
+Индекс в памяти процесса хранит для каждого ингредиента отсортированный
+массив id рецептов, где он есть, а для каждого рецепта - его ингредиенты.
+Доля покрытия рецепта считается пересечением массивов выбранных
+ингредиентов, без обращения к IngredientRecipe.
+
+Индекс строится одним запросом при первом обращении, а дальше перед
+каждым подбором дочитывает рецепты, изменённые с прошлого раза, по
+Recipe.updated_at: правки ингредиентов через API и админку меняют эту
+дату. Рецепты, удалённые в других процессах, выбрасываются при
+обнаружении, см. IngredientIndex.discard().
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import IngredientRecipe, Recipe
+
+# Запас на транзакции, которые зафиксировались позже, чем получили
+# свою дату изменения.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+Match = namedtuple('Match', ('recipe_id', 'coverage'))
+
+
+class IngredientIndex:
+    """Обратный индекс ингредиент -> рецепты."""
+
+    def __init__(self):
+        self._postings = {}
+        self._recipes = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        started = timezone.now()
+        postings = {}
+        recipes = {}
+        rows = (
+            IngredientRecipe.objects.order_by('ingredient_id', 'recipe_id')
+            .values_list('ingredient_id', 'recipe_id').iterator()
+        )
+        for ingredient_id, recipe_id in rows:
+            posting = postings.get(ingredient_id)
+            if posting is None:
+                posting = postings[ingredient_id] = array('l')
+            posting.append(recipe_id)
+            recipes.setdefault(recipe_id, []).append(ingredient_id)
+        with self._lock:
+            self._postings = postings
+            self._recipes = {
+                pk: tuple(sorted(ids)) for pk, ids in recipes.items()
+            }
+            self._synced_at = started
+
+    def sync(self):
+        """Дочитать рецепты, изменённые с прошлой синхронизации."""
+        if self._synced_at is None:
+            self.build()
+            return
+        started = timezone.now()
+        rows = Recipe.objects.filter(
+            updated_at__gte=self._synced_at - SYNC_OVERLAP
+        ).order_by().values_list('pk', 'ingredient_recipe__ingredient_id')
+        changed = {}
+        for pk, ingredient_id in rows:
+            ids = changed.setdefault(pk, [])
+            if ingredient_id is not None:
+                ids.append(ingredient_id)
+        with self._lock:
+            for pk, ids in changed.items():
+                self._set(pk, tuple(sorted(ids)))
+            self._synced_at = started
+
+    def _set(self, pk, ingredient_ids):
+        old = self._recipes.get(pk, ())
+        if old == ingredient_ids:
+            return
+        for ingredient_id in set(old).difference(ingredient_ids):
+            posting = self._postings[ingredient_id]
+            index = bisect_left(posting, pk)
+            if index < len(posting) and posting[index] == pk:
+                del posting[index]
+            if not posting:
+                del self._postings[ingredient_id]
+        for ingredient_id in set(ingredient_ids).difference(old):
+            posting = self._postings.get(ingredient_id)
+            if posting is None:
+                posting = self._postings[ingredient_id] = array('l')
+            posting.insert(bisect_left(posting, pk), pk)
+        if ingredient_ids:
+            self._recipes[pk] = ingredient_ids
+        else:
+            self._recipes.pop(pk, None)
+
+    def discard(self, *pks):
+        """Убрать удалённые рецепты."""
+        with self._lock:
+            for pk in pks:
+                self._set(pk, ())
+
+    def match(self, ingredient_ids, min_coverage):
+        """Рецепты, где выбранные ингредиенты покрывают не меньше
+        min_coverage всех ингредиентов; сначала самые полные."""
+        self.sync()
+        available = frozenset(ingredient_ids)
+        hits = Counter()
+        with self._lock:
+            for ingredient_id in available:
+                hits.update(self._postings.get(ingredient_id, ()))
+            matches = []
+            for pk, count in hits.items():
+                coverage = count / len(self._recipes[pk])
+                if coverage >= min_coverage:
+                    matches.append(Match(pk, coverage))
+        matches.sort(key=lambda match: (-match.coverage, -match.recipe_id))
+        return matches
+
+    def missing(self, pk, ingredient_ids):
+        """Ингредиенты рецепта, которых нет среди ingredient_ids."""
+        with self._lock:
+            required = self._recipes.get(pk, ())
+        return [
+            ingredient_id for ingredient_id in required
+            if ingredient_id not in ingredient_ids
+        ]
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'recipes': len(self._recipes),
+                'ingredients': len(self._postings),
+                'postings': sum(map(len, self._postings.values())),
+                'synced_at': self._synced_at,
+            }
+
+
+ingredient_index = IngredientIndex()
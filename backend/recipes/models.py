@@ -1,8 +1,14 @@
 from colorfield.fields import ColorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
-from users.models import User
+from users.models import Follow, User
+
+from .search import search, search_document_expression
+from .storage import recipe_image_storage
 
 
 class Ingredient(models.Model):
@@ -25,6 +31,12 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_measurement_unit',
+            )
+        ]
 
 
 class Tag(models.Model):
@@ -53,6 +65,83 @@ class Tag(models.Model):
         ordering = ['name']
 
 
+def recipe_prefetches():
+    """Связи рецепта, которые подгружаются отдельными запросами: теги и
+    ингредиенты с количеством."""
+    return (
+        'tags',
+        Prefetch(
+            'ingredient_recipe',
+            queryset=IngredientRecipe.objects.select_related('ingredient'),
+        ),
+    )
+
+
+class ImageStatus(models.IntegerChoices):
+    """Состояние уменьшенных копий картинки рецепта."""
+
+    PENDING = 0, 'Ожидает обработки'
+    READY = 1, 'Размеры готовы'
+    ORIGINAL = 2, 'Только оригинал'
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Запросы рецептов для чтения через API."""
+
+    def with_related(self):
+        """Подгрузить автора, теги и ингредиенты фиксированным числом
+        запросов, независимо от количества рецептов."""
+        return self.select_related('author').prefetch_related(
+            *recipe_prefetches()
+        )
+
+    def search(self, query):
+        """Полнотекстовый поиск с релевантностью в search_rank."""
+        return search(self, query)
+
+    def refresh_search_document(self):
+        """Пересобрать поисковый документ по данным в базе."""
+        return self.update(search_document=search_document_expression())
+
+    def change_counter(self, model, delta):
+        """Изменить счётчик добавлений в model (Favorite или ShoppingCart)
+        на delta, но не ниже нуля. Изменение избранного отмечает похожие
+        рецепты устаревшими, см. recipes.recommendations."""
+        counter = model.recipe_counter
+        changes = {counter: Greatest(F(counter) + delta, 0)}
+        if model is Favorite:
+            changes['neighbours_stale'] = True
+        return self.update(**changes)
+
+    def touch(self):
+        """Отметить рецепты изменёнными, не вызывая save(): например,
+        после правки их ингредиентов или тегов."""
+        return self.update(updated_at=timezone.now())
+
+    def with_user_flags(self, user):
+        """Добавить флаги is_favorited, is_in_shopping_cart и
+        is_author_subscribed для текущего пользователя."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, models.BooleanField()),
+                is_in_shopping_cart=Value(False, models.BooleanField()),
+                is_author_subscribed=Value(False, models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_author_subscribed=Exists(
+                Follow.objects.filter(
+                    user=OuterRef('author'), follower=user
+                )
+            ),
+        )
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -69,6 +158,13 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='recipes/',
+        storage=recipe_image_storage,
+    )
+    image_status = models.PositiveSmallIntegerField(
+        verbose_name='Размеры картинки',
+        choices=ImageStatus.choices,
+        default=ImageStatus.PENDING,
+        editable=False,
     )
     author = models.ForeignKey(
         User,
@@ -83,6 +179,11 @@ class Recipe(models.Model):
     text = models.TextField(
         verbose_name='Описание',
     )
+    search_document = models.TextField(
+        verbose_name='Поисковый документ',
+        blank=True,
+        editable=False,
+    )
     cooking_time = models.IntegerField(
         verbose_name='Время приготовления, мин.',
         validators=[
@@ -91,6 +192,27 @@ class Recipe(models.Model):
             )
         ],
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Количество добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='Количество добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    neighbours_stale = models.BooleanField(
+        verbose_name='Похожие рецепты устарели',
+        default=False,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -99,6 +221,22 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'], name='recipe_popular_idx'
+            ),
+            models.Index(fields=['updated_at'], name='recipe_updated_idx'),
+            models.Index(
+                fields=['id'],
+                name='recipe_image_pending_idx',
+                condition=models.Q(image_status=ImageStatus.PENDING),
+            ),
+            models.Index(
+                fields=['id'],
+                name='recipe_neighbours_stale_idx',
+                condition=models.Q(neighbours_stale=True),
+            ),
+        ]
 
 
 class IngredientRecipe(models.Model):
@@ -165,9 +303,75 @@ class TagRecipe(models.Model):
         ]
 
 
-class Favorite(models.Model):
+class UserRecipeQuerySet(models.QuerySet):
+    """Рецепты пользователя в избранном или списке покупок."""
+
+    def add_missing(self, user, recipe_ids):
+        """Добавить пользователю рецепты, которых у него ещё нет, одним
+        INSERT ... ON CONFLICT DO NOTHING и увеличить их счётчики; вернуть
+        множество id действительно добавленных рецептов.
+
+        Строки, вставленные параллельным запросом, пропускаются INSERT и
+        не попадают в RETURNING, поэтому не учитываются дважды.
+        """
+        if not recipe_ids:
+            return set()
+        model = self.model
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        user_column = quote(model._meta.get_field('user').column)
+        recipe_column = quote(model._meta.get_field('recipe').column)
+        sql = (
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({user_column}, {recipe_column}) VALUES '
+            + ', '.join(['(%s, %s)'] * len(recipe_ids))
+            + f' ON CONFLICT DO NOTHING RETURNING {recipe_column}'
+        )
+        params = [
+            value for pk in recipe_ids for value in (user.pk, pk)
+        ]
+        with transaction.atomic(using=self.db, savepoint=False):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                added = {row[0] for row in cursor.fetchall()}
+            if added:
+                Recipe.objects.filter(pk__in=added).change_counter(model, 1)
+        return added
+
+
+class RecipeCounterMixin:
+    """Поддерживает счётчик добавлений рецепта при save() и delete()
+    отдельной записи: в API, админке и через ORM.
+
+    Массовые операции над QuerySet меняют счётчик сами, удаление
+    пользователя - signals.release_recipe_counters().
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            if self._state.adding and not Recipe.objects.filter(
+                pk=self.recipe_id
+            ).change_counter(type(self), 1):
+                raise Recipe.DoesNotExist('Рецепт не найден.')
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            deleted = super().delete(*args, **kwargs)
+            if deleted[0]:
+                Recipe.objects.filter(pk=self.recipe_id).change_counter(
+                    type(self), -1
+                )
+        return deleted
+
+
+class Favorite(RecipeCounterMixin, models.Model):
     """Модель добавления рецепта в избранное."""
 
+    recipe_counter = 'favorites_count'
+
+    objects = UserRecipeQuerySet.as_manager()
+
     user = models.ForeignKey(
         User,
         verbose_name='Пользователь',
@@ -194,9 +398,13 @@ class Favorite(models.Model):
         ]
 
 
-class ShoppingCart(models.Model):
+class ShoppingCart(RecipeCounterMixin, models.Model):
     """Модель добавления рецепта в список покупок."""
 
+    recipe_counter = 'in_carts_count'
+
+    objects = UserRecipeQuerySet.as_manager()
+
     user = models.ForeignKey(
         User,
         verbose_name='Пользователь',
@@ -221,3 +429,36 @@ class ShoppingCart(models.Model):
                 fields=['user', 'recipe'], name='unique_shopping_cart'
             )
         ]
+
+
+class SimilarRecipe(models.Model):
+    """Модель похожего рецепта: сосед по совместным добавлениям в
+    избранное."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='neighbours',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        on_delete=models.CASCADE,
+        related_name='neighbour_of',
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+    )
+
+    def __str__(self):
+        return f'{self.recipe} похож на {self.similar}'
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'], name='unique_similar_recipe'
+            )
+        ]
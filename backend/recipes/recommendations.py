@@ -0,0 +1,227 @@
+"""Похожие рецепты и рекомендации по совместным добавлениям в избранное.
+
+Сходство рецептов i и j - косинусная мера их векторов в матрице
+пользователь x рецепт: c(i, j) / sqrt(n(i) * n(j)), где c - число
+пользователей, добавивших в избранное оба рецепта, а n - число
+добавлений рецепта. Строка матрицы совместных добавлений для рецепта
+считается сложением массивов избранного его поклонников в Counter, для
+каждого рецепта хранятся K ближайших соседей в SimilarRecipe.
+
+Изменение избранного отмечает рецепт флагом neighbours_stale, см.
+RecipeQuerySet.change_counter(). Пересчёт обходит только отмеченные
+рецепты и рецепты, которые с ними соседствуют; у остальных сходство не
+изменилось. Онлайн-запросы читают не больше K строк на рецепт.
+"""
+import heapq
+import math
+from array import array
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import Favorite, Recipe, SimilarRecipe
+
+NEIGHBOURS = getattr(settings, 'RECIPE_NEIGHBOURS', 20)
+# Сколько последних добавлений в избранное учитывают рекомендации.
+HISTORY = 50
+RECOMMENDATIONS = 100
+BATCH_SIZE = 1000
+
+
+class Favorites:
+    """Избранное части пользователей массивами: пользователь -> рецепты
+    и рецепт -> пользователи."""
+
+    def __init__(self, rows):
+        self.recipes = defaultdict(lambda: array('l'))
+        self.fans = defaultdict(lambda: array('l'))
+        for user_id, recipe_id in rows:
+            self.recipes[user_id].append(recipe_id)
+            self.fans[recipe_id].append(user_id)
+
+    @classmethod
+    def of_fans(cls, recipe_ids):
+        """Всё избранное пользователей, добавивших хоть один из
+        рецептов."""
+        fans = Favorite.objects.filter(recipe__in=recipe_ids).values('user')
+        return cls(
+            Favorite.objects.filter(user__in=fans).order_by()
+            .values_list('user_id', 'recipe_id').iterator()
+        )
+
+    def co_occurrence(self, recipe_id):
+        """Строка матрицы совместных добавлений для рецепта."""
+        counts = Counter()
+        for user_id in self.fans.get(recipe_id, ()):
+            counts.update(self.recipes[user_id])
+        counts.pop(recipe_id, None)
+        return counts
+
+
+def similarities(recipe_id, co_occurrence, totals):
+    size = totals.get(recipe_id) or 1
+    return {
+        other: common / math.sqrt(size * (totals.get(other) or 1))
+        for other, common in co_occurrence.items()
+    }
+
+
+def top(scores):
+    return heapq.nlargest(NEIGHBOURS, scores.items(), key=itemgetter(1, 0))
+
+
+def favorite_totals(recipe_ids):
+    """Число добавлений рецептов в избранное по строкам Favorite, как в
+    rebuild(), а не по счётчику favorites_count."""
+    return dict(
+        Favorite.objects.filter(recipe__in=recipe_ids).order_by()
+        .values('recipe').annotate(total=Count('pk'))
+        .values_list('recipe', 'total').iterator()
+    )
+
+
+def neighbours_of(recipe_ids):
+    """Соседи рецептов: полный пересчёт их строк."""
+    favorites = Favorites.of_fans(recipe_ids)
+    co_occurrences = {
+        pk: favorites.co_occurrence(pk) for pk in recipe_ids
+    }
+    totals = favorite_totals(
+        Favorite.objects.filter(
+            user__in=Favorite.objects.filter(
+                recipe__in=recipe_ids
+            ).values('user')
+        ).values('recipe')
+    )
+    return {
+        pk: similarities(pk, counts, totals)
+        for pk, counts in co_occurrences.items()
+    }
+
+
+def create_neighbours(rows):
+    SimilarRecipe.objects.bulk_create(
+        (
+            SimilarRecipe(recipe_id=pk, similar_id=other, score=score)
+            for pk, neighbours in rows.items()
+            for other, score in neighbours
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def save_neighbours(rows):
+    """Заменить соседей рецептов: rows - рецепт -> [(сосед, сходство)]."""
+    pks = list(rows)
+    with transaction.atomic():
+        for start in range(0, len(pks), BATCH_SIZE):
+            SimilarRecipe.objects.filter(
+                recipe__in=pks[start:start + BATCH_SIZE]
+            ).delete()
+        create_neighbours(rows)
+
+
+def rebuild():
+    """Пересчитать соседей всех рецептов за один проход по избранному;
+    вернуть число рецептов с соседями."""
+    Recipe.objects.filter(neighbours_stale=True).update(
+        neighbours_stale=False
+    )
+    favorites = Favorites(
+        Favorite.objects.order_by().values_list('user_id', 'recipe_id')
+        .iterator()
+    )
+    totals = {pk: len(fans) for pk, fans in favorites.fans.items()}
+    rows = {}
+    for pk in favorites.fans:
+        neighbours = top(similarities(
+            pk, favorites.co_occurrence(pk), totals
+        ))
+        if neighbours:
+            rows[pk] = neighbours
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        create_neighbours(rows)
+    return len(rows)
+
+
+def refresh(batch_size=500):
+    """Пересчитать соседей до batch_size рецептов, отмеченных
+    neighbours_stale, и поправить списки их соседей; вернуть число
+    обработанных отмеченных рецептов.
+
+    Флаг снимается до чтения избранного, поэтому изменения, сделанные
+    во время пересчёта, попадут в следующий.
+    """
+    stale = list(
+        Recipe.objects.filter(neighbours_stale=True).order_by('id')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not stale:
+        return 0
+    Recipe.objects.filter(pk__in=stale).update(neighbours_stale=False)
+    scores = neighbours_of(stale)
+    rows = {pk: top(scores[pk]) for pk in stale}
+
+    # Сходство остальных рецептов между собой не изменилось: у них
+    # меняются только пары с пересчитанными рецептами.
+    changed_pairs = defaultdict(dict)
+    for pk, row in scores.items():
+        for other, score in row.items():
+            if other not in rows:
+                changed_pairs[other][pk] = score
+    stored = defaultdict(dict)
+    for pk, other, score in SimilarRecipe.objects.filter(
+        Q(recipe__in=Favorite.objects.filter(
+            user__in=Favorite.objects.filter(recipe__in=stale).values('user')
+        ).values('recipe')) | Q(similar__in=stale)
+    ).exclude(recipe__in=stale).values_list('recipe', 'similar', 'score'):
+        stored[pk][other] = score
+    demoted = set()
+    for pk in set(stored) | set(changed_pairs):
+        current = stored.get(pk, {})
+        pairs = changed_pairs.get(pk, {})
+        # Если сосед стал менее похож, его место в топе может занять
+        # рецепт, которого в сохранённом списке нет.
+        if any(
+            pairs.get(other, 0) < score
+            for other, score in current.items() if other in scores
+        ):
+            demoted.add(pk)
+            continue
+        neighbours = top({**current, **pairs})
+        if neighbours != top(current):
+            rows[pk] = neighbours
+    if demoted:
+        for pk, row in neighbours_of(list(demoted)).items():
+            rows[pk] = top(row)
+    save_neighbours(rows)
+    return len(stale)
+
+
+def similar_recipes(recipe_id):
+    """Соседи рецепта: пары (id, сходство), самые похожие первыми."""
+    return list(
+        SimilarRecipe.objects.filter(recipe_id=recipe_id)
+        .order_by('-score', '-similar_id')
+        .values_list('similar_id', 'score')
+    )
+
+
+def recommended_recipes(user):
+    """Рецепты, похожие на последние избранные рецепты пользователя и не
+    добавленные им в избранное: пары (id, суммарное сходство)."""
+    history = (
+        Favorite.objects.filter(user=user).order_by('-id')
+        .values('recipe')[:HISTORY]
+    )
+    return list(
+        SimilarRecipe.objects.filter(recipe__in=history)
+        .exclude(similar__favorite__user=user)
+        .values('similar').annotate(total=Sum('score'))
+        .order_by('-total', '-similar').values_list('similar', 'total')
+        [:RECOMMENDATIONS]
+    )
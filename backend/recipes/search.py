@@ -0,0 +1,134 @@
+"""Полнотекстовый поиск рецептов.
+
+Поисковый документ рецепта (названия ингредиентов и описание) хранится в
+Recipe.search_document, название индексируется отдельно с большим весом.
+На PostgreSQL поиск идёт по GIN-индексу над to_tsvector, на SQLite - по
+таблице FTS5, которую триггеры держат в согласии с таблицей рецептов.
+Индексы создаются после migrate, см. recipes.signals.
+"""
+import re
+
+from django.apps import apps
+from django.db import connections
+from django.db.models import (Aggregate, BooleanField, Case, F, FloatField,
+                              OuterRef, Q, Subquery, TextField, Value, When,)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Concat
+
+SEARCH_CONFIG = 'russian'
+RECIPE_TABLE = 'recipes_recipe'
+FTS_TABLE = 'recipes_recipe_fts'
+NAME_WEIGHT = 10.0
+
+POSTGRES_VECTOR = (
+    f"(setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, {{prefix}}name), "
+    f"'A') || to_tsvector('{SEARCH_CONFIG}'::regconfig, "
+    f"{{prefix}}search_document))"
+)
+POSTGRES_QUERY = f"plainto_tsquery('{SEARCH_CONFIG}'::regconfig, %s)"
+POSTGRES_INDEXES = (
+    f'CREATE INDEX IF NOT EXISTS {RECIPE_TABLE}_search_gin '
+    f'ON {RECIPE_TABLE} USING gin ({POSTGRES_VECTOR.format(prefix="")})',
+)
+SQLITE_FTS = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"name, search_document, content='{RECIPE_TABLE}', content_rowid='id')",
+    f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {RECIPE_TABLE} "
+    f"BEGIN INSERT INTO {FTS_TABLE}(rowid, name, search_document) "
+    f"VALUES (new.id, new.name, new.search_document); END",
+    f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {RECIPE_TABLE} "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, "
+    f"search_document) VALUES ('delete', old.id, old.name, "
+    f"old.search_document); END",
+    f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF name, "
+    f"search_document ON {RECIPE_TABLE} "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, "
+    f"search_document) VALUES ('delete', old.id, old.name, "
+    f"old.search_document); INSERT INTO {FTS_TABLE}(rowid, name, "
+    f"search_document) VALUES (new.id, new.name, new.search_document); "
+    f"END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+
+class GroupConcat(Aggregate):
+    """Строки группы через пробел: GROUP_CONCAT или STRING_AGG."""
+
+    function = 'GROUP_CONCAT'
+    template = "%(function)s(%(expressions)s, ' ')"
+    output_field = TextField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, function='STRING_AGG', **extra_context
+        )
+
+
+def search_document_expression():
+    """Поисковый документ рецепта: названия ингредиентов через пробел и
+    описание."""
+    names = (
+        apps.get_model('recipes', 'IngredientRecipe').objects
+        .filter(recipe=OuterRef('pk')).order_by().values('recipe')
+        .annotate(names=GroupConcat('ingredient__name')).values('names')
+    )
+    return Concat(
+        Coalesce(Subquery(names), Value('')), Value('\n'), F('text'),
+        output_field=TextField(),
+    )
+
+
+def create_search_indexes(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRES_INDEXES:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            if FTS_TABLE in connection.introspection.table_names(cursor):
+                return
+            for sql in SQLITE_FTS:
+                cursor.execute(sql)
+
+
+def fts5_query(query):
+    """Запрос FTS5 из слов пользователя: все слова, каждое по началу."""
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(queryset, query):
+    """Рецепты, подходящие под запрос, с релевантностью search_rank."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        vector = POSTGRES_VECTOR.format(prefix=f'"{RECIPE_TABLE}".')
+        return queryset.filter(RawSQL(
+            f'{vector} @@ {POSTGRES_QUERY}', (query,),
+            output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank({vector}, {POSTGRES_QUERY})', (query,),
+            output_field=FloatField(),
+        ))
+    if vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return queryset.none()
+        # bm25() доступна только в запросе, где таблица FTS5 стоит во FROM,
+        # а модели у неё нет, поэтому соединение через extra().
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE} MATCH %s',
+                f'{FTS_TABLE}.rowid = "{RECIPE_TABLE}"."id"',
+            ],
+            params=[match],
+        ).annotate(search_rank=RawSQL(
+            f'-bm25({FTS_TABLE}, {NAME_WEIGHT}, 1.0)', (),
+            output_field=FloatField(),
+        ))
+    return queryset.filter(
+        Q(name__icontains=query) | Q(search_document__icontains=query)
+    ).annotate(search_rank=Case(
+        When(name__icontains=query, then=Value(NAME_WEIGHT)),
+        default=Value(1.0),
+        output_field=FloatField(),
+    ))
@@ -0,0 +1,100 @@
+from django.db import connections
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_migrate,)
+from django.dispatch import Signal, receiver
+
+from users.models import User
+
+from .duplicates import merge_duplicate_ingredients
+from .matching import ingredient_index
+from .models import Favorite, Ingredient, Recipe, ShoppingCart
+from .search import create_search_indexes
+
+# Отправляется после массового изменения справочника в обход save(),
+# sender - модель справочника (Tag или Ingredient).
+catalog_changed = Signal()
+
+INGREDIENT_SEARCH_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS {table}_name_lower_prefix '
+    'ON {table} (LOWER(name) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS {table}_name_lower_trgm '
+    'ON {table} USING gin (LOWER(name) gin_trgm_ops)',
+)
+
+
+@receiver(pre_migrate)
+def merge_ingredients_before_migrate(sender, using, apps, **kwargs):
+    """Слить дубли ингредиентов до миграции, которая добавляет
+    ограничение unique_ingredient_measurement_unit."""
+    if sender.name != 'recipes':
+        return
+    try:
+        models = [
+            apps.get_model('recipes', name)
+            for name in ('Ingredient', 'IngredientRecipe', 'Recipe')
+        ]
+    except LookupError:
+        return
+    tables = connections[using].introspection.table_names()
+    if any(model._meta.db_table not in tables for model in models):
+        return
+    merge_duplicate_ingredients(*models, using=using)
+
+
+@receiver(post_migrate)
+def create_ingredient_search_indexes(sender, using, **kwargs):
+    """Индексы для поиска ингредиентов по LOWER(name) на PostgreSQL."""
+    connection = connections[using]
+    if sender.name != 'recipes' or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for sql in INGREDIENT_SEARCH_INDEXES:
+            cursor.execute(sql.format(table=Ingredient._meta.db_table))
+
+
+@receiver(post_migrate)
+def create_recipe_search_indexes(sender, using, **kwargs):
+    """GIN-индекс поиска рецептов на PostgreSQL, таблица FTS5 на SQLite."""
+    if sender.name == 'recipes':
+        create_search_indexes(connections[using])
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_recipes(sender, instance, created, **kwargs):
+    """Название ингредиента входит в поисковый документ рецептов."""
+    if not created:
+        Recipe.objects.filter(
+            ingredient_recipe__ingredient=instance
+        ).refresh_search_document()
+
+
+@receiver(pre_delete, sender=Ingredient)
+def remember_ingredient_recipes(sender, instance, **kwargs):
+    instance.recipe_ids = list(
+        Recipe.objects.filter(
+            ingredient_recipe__ingredient=instance
+        ).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Ingredient)
+def refresh_deleted_ingredient_recipes(sender, instance, **kwargs):
+    Recipe.objects.filter(
+        pk__in=instance.recipe_ids
+    ).refresh_search_document()
+
+
+@receiver(post_delete, sender=Recipe)
+def discard_indexed_recipe(sender, instance, **kwargs):
+    ingredient_index.discard(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def release_recipe_counters(sender, instance, **kwargs):
+    """Уменьшить счётчики рецептов, которые удалятся каскадом с
+    пользователем."""
+    for model in (Favorite, ShoppingCart):
+        Recipe.objects.filter(
+            pk__in=model.objects.filter(user=instance).values('recipe')
+        ).change_counter(model, -1)
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла - SHA-256 его содержимого.
+
+    Одинаковые загрузки хранятся одним файлом, а содержимое по данному
+    имени никогда не меняется, поэтому его можно кешировать навсегда.
+    Файлы не удаляются вместе с записями: один файл может принадлежать
+    нескольким рецептам. Неиспользуемые файлы убирает команда
+    cleanup_media.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(directory, digest.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if not self.exists(name):
+            try:
+                return super().save(name, content, max_length)
+            except FileExistsError:
+                # Тот же файл одновременно сохранил другой запрос.
+                pass
+        # Свежая дата изменения защищает файл от cleanup_media, пока
+        # ссылающаяся на него запись ещё не сохранена.
+        os.utime(self.path(name))
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        """Имя не меняется: суффикс сломал бы связь имени с содержимым.
+        Занятое имя значит, что такой файл уже есть, см. save()."""
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+
+recipe_image_storage = ContentAddressedStorage()
@@ -0,0 +1,231 @@
+"""Генерация синтетических данных для нагрузочных замеров.
+
+Популярность ингредиентов, авторов и рецептов распределена по степенному
+закону (вес элемента с рангом r пропорционален 1 / r ** exponent), так
+что соль и сахар встречаются в тысячах рецептов, а у нескольких авторов
+большинство подписчиков. Строки рецептов создаются кусками; каждый кусок
+получает свой генератор, производный от seed и номера куска, поэтому
+результат не зависит от числа процессов.
+"""
+import io
+import itertools
+import multiprocessing
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connections
+
+from users.models import Follow, User
+
+from .models import (Favorite, ImageStatus, Ingredient, IngredientRecipe,
+                     Recipe, ShoppingCart, Tag, TagRecipe,)
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+CHUNK_SIZE = 5000
+
+
+class PowerLaw:
+    """Выбор элементов с весом 1 / rank ** exponent."""
+
+    def __init__(self, items, exponent):
+        self.items = list(items)
+        self.cum_weights = list(itertools.accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+
+    def choice(self, rng):
+        return rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+    def sample(self, rng, count):
+        """count разных элементов (или все, если их меньше)."""
+        count = min(count, len(self.items))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(rng.choices(
+                self.items, cum_weights=self.cum_weights,
+                k=count - len(chosen),
+            ))
+        return chosen
+
+
+def chunk_rng(seed, name, number):
+    return random.Random(f'{seed}:{name}:{number}')
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bounded_gauss(rng, mean, low, high):
+    return min(high, max(low, round(rng.gauss(mean, mean / 3))))
+
+
+def ensure_tags():
+    Tag.objects.bulk_create(
+        [Tag(name=name, color=color, slug=slug)
+         for name, color, slug in DEFAULT_TAGS],
+        ignore_conflicts=True,
+    )
+    return list(Tag.objects.values_list('pk', flat=True))
+
+
+def create_users(count, prefix, batch_size):
+    password = make_password('synthetic-password')
+    User.objects.bulk_create((
+        User(
+            email=f'{prefix}{number}@example.com',
+            username=f'{prefix}{number}',
+            first_name='Имя',
+            last_name='Фамилия',
+            password=password,
+        )
+        for number in range(count)
+    ), batch_size=batch_size, ignore_conflicts=True)
+    return list(
+        User.objects.filter(username__startswith=prefix)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def create_recipes(rng, count, authors, batch_size):
+    last_id = (
+        Recipe.objects.order_by('-pk').values_list('pk', flat=True).first()
+        or 0
+    )
+    Recipe.objects.bulk_create((
+        Recipe(
+            author_id=authors.choice(rng),
+            name=f'Рецепт {number}',
+            text='Описание синтетического рецепта.',
+            cooking_time=bounded_gauss(rng, 40, 5, 240),
+            image='recipes/synthetic.png',
+            image_status=ImageStatus.ORIGINAL,
+        )
+        for number in range(count)
+    ), batch_size=batch_size)
+    return list(
+        Recipe.objects.filter(pk__gt=last_id)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def create_recipe_rows(task):
+    """Ингредиенты и теги для куска рецептов; выполняется и в отдельном
+    процессе."""
+    (number, recipe_ids, ingredients, tag_ids, ingredients_mean, seed,
+     batch_size) = task
+    rng = chunk_rng(seed, 'recipe-rows', number)
+    ingredient_rows = []
+    tag_rows = []
+    for recipe_id in recipe_ids:
+        count = bounded_gauss(rng, ingredients_mean, 1, 30)
+        ingredient_rows.extend(
+            IngredientRecipe(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=rng.choice((1, 2, 5, 10, 50, 100, 200, 500)),
+            )
+            for ingredient_id in ingredients.sample(rng, count)
+        )
+        tag_rows.extend(
+            TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+            for tag_id in rng.sample(tag_ids, rng.choice((1, 1, 2, 3)))
+        )
+    IngredientRecipe.objects.bulk_create(
+        ingredient_rows, batch_size=batch_size, ignore_conflicts=True
+    )
+    TagRecipe.objects.bulk_create(
+        tag_rows, batch_size=batch_size, ignore_conflicts=True
+    )
+    return len(ingredient_rows)
+
+
+def create_follows(seed, user_ids, authors, follows_mean, batch_size):
+    rows = 0
+    for number, chunk in enumerate(chunks(user_ids)):
+        rng = chunk_rng(seed, 'follows', number)
+        objects = [
+            Follow(user_id=author_id, follower_id=user_id)
+            for user_id in chunk
+            for author_id in authors.sample(
+                rng, int(rng.paretovariate(1.5) * follows_mean / 3)
+            )
+            if author_id != user_id
+        ]
+        Follow.objects.bulk_create(
+            objects, batch_size=batch_size, ignore_conflicts=True
+        )
+        rows += len(objects)
+    return rows
+
+
+def create_user_recipes(model, seed, user_ids, recipes, per_user_mean,
+                        batch_size):
+    rows = 0
+    for number, chunk in enumerate(chunks(user_ids)):
+        rng = chunk_rng(seed, model.__name__, number)
+        objects = [
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in chunk
+            for recipe_id in recipes.sample(
+                rng, int(rng.expovariate(1 / per_user_mean))
+            )
+        ]
+        model.objects.bulk_create(
+            objects, batch_size=batch_size, ignore_conflicts=True
+        )
+        rows += len(objects)
+    return rows
+
+
+def generate(users=100, recipes=1000, follows=5, favorites=10, carts=3,
+             ingredients_per_recipe=8, seed=0, prefix='synthetic',
+             batch_size=2000, workers=1, log=None):
+    """Создать пользователей, рецепты с ингредиентами и тегами, подписки,
+    избранное и списки покупок.
+
+    follows, favorites, carts и ingredients_per_recipe - средние значения
+    на пользователя и на рецепт. При workers > 1 строки рецептов
+    вставляются параллельно в отдельных процессах.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    tag_ids = ensure_tags()
+    ingredients = PowerLaw(
+        Ingredient.objects.order_by('pk').values_list('pk', flat=True), 1.0
+    )
+    user_ids = create_users(users, prefix, batch_size)
+    log(f'Пользователей: {len(user_ids)}')
+    authors = PowerLaw(rng.sample(user_ids, len(user_ids)), 1.1)
+    recipe_ids = create_recipes(rng, recipes, authors, batch_size)
+    log(f'Рецептов: {len(recipe_ids)}')
+
+    tasks = [
+        (number, chunk, ingredients, tag_ids, ingredients_per_recipe, seed,
+         batch_size)
+        for number, chunk in enumerate(chunks(recipe_ids))
+    ]
+    if workers > 1:
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(workers, initializer=connections.close_all) as pool:
+            rows = sum(pool.imap_unordered(create_recipe_rows, tasks))
+    else:
+        rows = sum(map(create_recipe_rows, tasks))
+    log(f'Строк IngredientRecipe: {rows}')
+
+    rows = create_follows(seed, user_ids, authors, follows, batch_size)
+    log(f'Подписок: {rows}')
+    popular = PowerLaw(rng.sample(recipe_ids, len(recipe_ids)), 0.9)
+    for model, mean in ((Favorite, favorites), (ShoppingCart, carts)):
+        rows = create_user_recipes(
+            model, seed, user_ids, popular, mean, batch_size
+        )
+        log(f'Строк {model.__name__}: {rows}')
+    call_command('recount', stdout=io.StringIO())
+    return user_ids, recipe_ids
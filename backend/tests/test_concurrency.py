@@ -0,0 +1,57 @@
+"""Параллельные добавления и удаления рецепта одним пользователем."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.db import connection
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import User
+
+THREADS = 8
+
+
+def run_parallel(user, method, url):
+    barrier = threading.Barrier(THREADS)
+
+    def request():
+        client = APIClient()
+        client.force_authenticate(user)
+        try:
+            barrier.wait()
+            return getattr(client, method)(url).status_code
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        return sorted(pool.map(lambda _: request(), range(THREADS)))
+
+
+@pytest.mark.skipif(
+    connection.vendor == 'sqlite'
+    and connection.settings_dict['TEST']['NAME'] is None,
+    reason='потокам нужна общая база в файле',
+)
+@pytest.mark.parametrize(
+    'model, action', ((Favorite, 'favorite'), (ShoppingCart, 'shopping_cart'))
+)
+def test_parallel_toggles(transactional_db, model, action):
+    user = User.objects.create_user(
+        email='parallel@example.com', username='parallel', password='x',
+        first_name='Имя', last_name='Фамилия',
+    )
+    recipe = Recipe.objects.create(
+        author=user, name='Рецепт', text='Текст', cooking_time=1
+    )
+    url = f'/api/recipes/{recipe.pk}/{action}/'
+
+    def check(rows):
+        recipe.refresh_from_db()
+        assert model.objects.filter(user=user, recipe=recipe).count() == rows
+        assert getattr(recipe, model.recipe_counter) == rows
+
+    assert run_parallel(user, 'post', url) == [201] + [400] * (THREADS - 1)
+    check(1)
+    assert run_parallel(user, 'delete', url) == [204] + [400] * (THREADS - 1)
+    check(0)
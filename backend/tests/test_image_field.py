@@ -0,0 +1,37 @@
+"""Декодирование картинок в base64 по частям."""
+import base64
+import io
+
+import pytest
+from PIL import Image
+from rest_framework.serializers import ValidationError
+
+from api import fields
+from api.fields import StreamingBase64ImageField
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), 'orange').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('chunk_size', (7, 64 * 1024))
+def test_decode_skips_line_breaks(monkeypatch, chunk_size):
+    monkeypatch.setattr(fields, 'DECODE_CHUNK_SIZE', chunk_size)
+    content = png_bytes()
+    data = 'data:image/png;base64,' + base64.encodebytes(content).decode()
+    assert '\n' in data
+
+    upload = StreamingBase64ImageField().to_internal_value(data)
+
+    assert upload.read() == content
+    assert upload.name.endswith('.png')
+
+
+def test_decode_rejects_invalid_characters():
+    data = base64.b64encode(png_bytes()).decode()
+    with pytest.raises(ValidationError):
+        StreamingBase64ImageField().to_internal_value(
+            f'data:image/png;base64,{data[:40]}*{data[40:]}'
+        )
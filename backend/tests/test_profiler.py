@@ -0,0 +1,30 @@
+"""Сегменты времени QueryProfilerMiddleware."""
+import json
+
+import pytest
+from rest_framework.test import APIClient
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize(
+    'url', ('/api/recipes/?limit=24', '/api/users/subscriptions/')
+)
+def test_serialize_segment(settings, tmp_path, user, url):
+    settings.QUERY_PROFILER = True
+    settings.QUERY_PROFILER_LOG = str(tmp_path / 'profiler.log')
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get(url)
+
+    assert response.status_code == 200
+    segments = [
+        part.split(';')[0] for part in response['Server-Timing'].split(', ')
+    ]
+    assert segments == ['db', 'view', 'serialize', 'render', 'total']
+    record = json.loads((tmp_path / 'profiler.log').read_text())
+    assert record['serialize_ms'] > 0
+    assert record['total_ms'] >= (
+        record['db_ms'] + record['serialize_ms'] + record['render_ms']
+    )
@@ -0,0 +1,190 @@
+"""Потолки SQL-запросов для каждого маршрута api/urls.py и users/urls.py.
+
+Данные - синтетический набор из conftest.dataset. Тест падает, если
+маршрут сделал больше запросов, чем записано, например при возврате
+N+1 в ReadOnlyRecipeSerializer или FollowSerializer.
+"""
+import pytest
+from django.core.cache import cache
+
+from api.cache import recipe_cache
+from recipes.models import Ingredient, Recipe, SimilarRecipe
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def call(django_assert_num_queries):
+    """Выполнить запрос, проверив число SQL-запросов и код ответа."""
+
+    def call(client, method, url, queries, status=None, data=None,
+             **headers):
+        with django_assert_num_queries(queries):
+            response = getattr(client, method)(
+                url, data, format='json', **headers
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+        if status is not None:
+            assert response.status_code == status, response.content
+        return response
+
+    return call
+
+
+@pytest.fixture
+def recipe_url(dataset):
+    return f'/api/recipes/{dataset.recipe_ids[0]}/'
+
+
+@pytest.fixture
+def own_recipe_url(user_client, payload):
+    response = user_client.post('/api/recipes/', payload, format='json')
+    return f'/api/recipes/{response.json()["id"]}/'
+
+
+def test_tags(call, anon_client, dataset):
+    call(anon_client, 'get', '/api/tags/', 1, 200)
+    call(anon_client, 'get', '/api/tags/', 0, 200)
+    call(anon_client, 'get', f'/api/tags/{dataset.tag.pk}/', 1, 200)
+
+
+def test_ingredients(call, anon_client, dataset):
+    call(anon_client, 'get', '/api/ingredients/', 1, 200)
+    call(anon_client, 'get', '/api/ingredients/', 0, 200)
+    call(anon_client, 'get', '/api/ingredients/?name=сах', 1, 200)
+    ingredient = Ingredient.objects.first()
+    call(anon_client, 'get', f'/api/ingredients/{ingredient.pk}/', 1, 200)
+
+
+@pytest.mark.parametrize('limit', (6, 24, 96))
+def test_recipes_list(call, user_client, limit):
+    response = call(user_client, 'get', f'/api/recipes/?limit={limit}', 4, 200)
+    call(
+        user_client, 'get', f'/api/recipes/?limit={limit}', 2, 304,
+        HTTP_IF_NONE_MATCH=response['ETag'],
+    )
+
+
+def test_recipes_anon(call, anon_client):
+    call(anon_client, 'get', '/api/recipes/', 4, 200)
+
+
+def test_recipes_filters(call, user_client, dataset):
+    call(
+        user_client, 'get',
+        f'/api/recipes/?tags={dataset.tag.slug}&is_favorited=1', 5, 200,
+    )
+    call(user_client, 'get', '/api/recipes/?ordering=popular', 4, 200)
+    call(user_client, 'get', '/api/recipes/?cursor=&limit=24', 3, 200)
+    call(user_client, 'get', '/api/recipes/?search=рецепт', 4, 200)
+
+
+def test_recipes_cook(call, user_client, dataset):
+    ingredient_ids = Recipe.objects.get(
+        pk=dataset.recipe_ids[0]
+    ).ingredients.values_list('pk', flat=True)[:3]
+    url = '/api/recipes/cook/?' + '&'.join(
+        f'ingredients={pk}' for pk in ingredient_ids
+    ) + '&min_coverage=0.3'
+    call(user_client, 'get', url, 4, 200)
+    call(user_client, 'get', url, 2, 200)
+
+
+def test_recipes_similar_and_recommended(call, user_client, dataset):
+    similar = SimilarRecipe.objects.values_list('recipe', flat=True)[0]
+    call(user_client, 'get', f'/api/recipes/{similar}/similar/', 5, 200)
+    call(user_client, 'get', '/api/recipes/recommended/', 4, 200)
+
+
+def test_recipe(call, user_client, recipe_url):
+    response = call(user_client, 'get', recipe_url, 3, 200)
+    call(
+        user_client, 'get', recipe_url, 1, 304,
+        HTTP_IF_NONE_MATCH=response['ETag'],
+    )
+
+
+def test_download_shopping_cart(call, user_client):
+    url = '/api/recipes/download_shopping_cart/'
+    call(user_client, 'get', url, 1, 200)
+    call(user_client, 'get', f'{url}?format=csv', 1, 200)
+
+
+def test_recipe_create(call, user_client, payload):
+    call(user_client, 'post', '/api/recipes/', 11, 201, payload)
+
+
+def test_recipe_update_and_delete(call, user_client, payload, own_recipe_url):
+    payload['ingredients'][0]['amount'] = 20
+    payload['name'] = 'Замер 2'
+    call(user_client, 'patch', own_recipe_url, 14, 200, payload)
+    call(user_client, 'delete', own_recipe_url, 8, 204)
+
+
+@pytest.mark.parametrize('action', ('favorite', 'shopping_cart'))
+def test_user_recipe_toggles(call, user_client, own_recipe_url, action):
+    url = f'{own_recipe_url}{action}/'
+    call(user_client, 'post', url, 5, 201)
+    call(user_client, 'post', url, 5, 400)
+    call(user_client, 'delete', url, 4, 204)
+
+
+@pytest.mark.parametrize('action', ('favorite', 'shopping_cart'))
+def test_user_recipe_bulk(call, user_client, action):
+    ids = list(Recipe.objects.values_list('pk', flat=True)[:20])
+    url = f'/api/recipes/{action}/'
+    call(user_client, 'post', url, 5, 200, {'ids': ids})
+    call(user_client, 'delete', url, 5, 200, {'clear': True})
+
+
+def test_users(call, anon_client, user_client, dataset):
+    call(anon_client, 'get', '/api/users/', 2, 200)
+    call(user_client, 'get', '/api/users/', 3, 200)
+    call(user_client, 'get', f'/api/users/{dataset.user_id}/', 1, 200)
+    call(user_client, 'get', '/api/users/me/', 1, 200)
+
+
+@pytest.mark.parametrize('limit', (6, 24))
+def test_subscriptions(call, user_client, limit):
+    call(
+        user_client, 'get',
+        f'/api/users/subscriptions/?limit={limit}&recipes_limit=3', 3, 200,
+    )
+
+
+def test_subscribe(call, user_client, dataset):
+    url = f'/api/users/{dataset.author_id}/subscribe/'
+    call(user_client, 'delete', url, 1, 204)
+    call(user_client, 'post', url, 5, 201)
+
+
+def test_registration_and_auth(call, anon_client):
+    call(anon_client, 'post', '/api/users/', 5, 201, {
+        'email': 'test-new@example.com', 'username': 'test-new',
+        'first_name': 'Имя', 'last_name': 'Фамилия',
+        'password': 'Test-Password-1',
+    })
+    login = call(anon_client, 'post', '/api/auth/token/login/', 7, 200, {
+        'email': 'test-new@example.com', 'password': 'Test-Password-1',
+    })
+    anon_client.credentials(
+        HTTP_AUTHORIZATION=f'Token {login.json()["auth_token"]}'
+    )
+    call(anon_client, 'post', '/api/users/set_password/', 3, 204, {
+        'current_password': 'Test-Password-1',
+        'new_password': 'Test-Password-2',
+    })
+    call(anon_client, 'post', '/api/auth/token/logout/', 3, 204)
+
+
+def test_recipes_list_queries_do_not_grow(
+    anon_client, user_client, django_assert_num_queries
+):
+    for client in (anon_client, user_client):
+        for limit in (6, 96):
+            cache.clear()
+            recipe_cache.clear()
+            with django_assert_num_queries(4):
+                response = client.get(f'/api/recipes/?limit={limit}')
+            assert len(response.json()['results']) == limit
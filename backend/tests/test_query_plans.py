@@ -0,0 +1,68 @@
+"""Планы запросов каталога рецептов: сортировки и фильтры идут по
+индексам, а не полным просмотром таблиц."""
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+
+from api.filters import RecipeFilter
+from recipes.models import Recipe
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(
+        connection.vendor != 'sqlite', reason='EXPLAIN QUERY PLAN SQLite'
+    ),
+]
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    return [
+        line for line in plan
+        if line.startswith('SCAN') and 'INDEX' not in line
+    ]
+
+
+def test_popular_ordering_uses_index(dataset):
+    plan = query_plan(
+        Recipe.objects.order_by('-favorites_count', '-id')[:24]
+    )
+    assert not full_scans(plan), plan
+    assert any('recipe_popular_idx' in line for line in plan), plan
+
+
+def filter_plan(params, user):
+    request = RequestFactory().get('/api/recipes/')
+    request.user = user
+    return query_plan(RecipeFilter(
+        params, queryset=Recipe.objects.all(), request=request
+    ).qs)
+
+
+def uses_tag_index(plan):
+    return any(
+        line.startswith('SEARCH') and 'recipes_tagrecipe' in line
+        and 'INDEX' in line
+        for line in plan
+    )
+
+
+def test_tag_filter_uses_tag_index(dataset, user):
+    plan = filter_plan({'tags': [dataset.tag.slug]}, user)
+    assert uses_tag_index(plan), plan
+
+
+def test_combined_recipe_filter_uses_indexes(dataset, user):
+    plan = filter_plan(
+        {'tags': [dataset.tag.slug], 'is_favorited': 'true',
+         'is_in_shopping_cart': 'true', 'author': dataset.author_id},
+        user,
+    )
+    assert not full_scans(plan), plan
+    assert uses_tag_index(plan), plan
@@ -0,0 +1,103 @@
+"""Счётчики добавлений рецепта в избранное и списки покупок при
+изменениях в обход API."""
+import pytest
+from django.contrib.admin.sites import site
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def recipe(user):
+    return Recipe.objects.exclude(favorite__user=user).exclude(
+        shopping_cart__user=user
+    ).first()
+
+
+def counter(recipe, model):
+    recipe.refresh_from_db()
+    return getattr(recipe, model.recipe_counter)
+
+
+@pytest.mark.parametrize('model', (Favorite, ShoppingCart))
+def test_orm_save_and_delete_change_counter(user, recipe, model):
+    before = counter(recipe, model)
+    row = model.objects.create(user=user, recipe=recipe)
+    assert counter(recipe, model) == before + 1
+    row.delete()
+    assert counter(recipe, model) == before
+
+
+@pytest.mark.parametrize('model', (Favorite, ShoppingCart))
+def test_orm_save_of_missing_recipe(user, model):
+    with pytest.raises(Recipe.DoesNotExist):
+        model.objects.create(user=user, recipe_id=0)
+
+
+@pytest.mark.parametrize(
+    'model, action', ((Favorite, 'favorite'), (ShoppingCart, 'shopping_cart'))
+)
+def test_stale_counter_does_not_go_below_zero(user, user_client, recipe,
+                                              model, action):
+    model.objects.create(user=user, recipe=recipe)
+    Recipe.objects.filter(pk=recipe.pk).update(**{model.recipe_counter: 0})
+    response = user_client.delete(f'/api/recipes/{recipe.pk}/{action}/')
+    assert response.status_code == 204
+    assert counter(recipe, model) == 0
+
+
+@pytest.mark.parametrize('model', (Favorite, ShoppingCart))
+def test_admin_changes_keep_counters(user, recipe, model, rf):
+    other = Recipe.objects.exclude(pk=recipe.pk).exclude(
+        pk__in=model.objects.filter(user=user).values('recipe')
+    ).first()
+    admin = site._registry[model]
+    request = rf.post('/')
+    request.user = user
+    before, other_before = counter(recipe, model), counter(other, model)
+
+    row = model.objects.create(user=user, recipe=recipe)
+    form = admin.get_form(request, row)(
+        {'user': user.pk, 'recipe': other.pk}, instance=row,
+        initial={'user': user.pk, 'recipe': recipe.pk},
+    )
+    assert form.is_valid(), form.errors
+    admin.save_model(request, form.save(commit=False), form, change=True)
+    assert counter(recipe, model) == before
+    assert counter(other, model) == other_before + 1
+
+    admin.delete_queryset(
+        request, model.objects.filter(recipe__in=(recipe, other))
+    )
+    assert counter(recipe, model) == 0
+    assert counter(other, model) == 0
+
+
+@pytest.mark.parametrize(
+    'model, action', ((Favorite, 'favorite'), (ShoppingCart, 'shopping_cart'))
+)
+def test_bulk_add_counts_only_inserted_rows(user, user_client, model,
+                                            action):
+    recipes = list(Recipe.objects.exclude(
+        pk__in=model.objects.filter(user=user).values('recipe')
+    )[:3])
+    before = [counter(recipe, model) for recipe in recipes]
+    # Строка, вставленная параллельным запросом, уже есть в таблице.
+    model.objects.create(user=user, recipe=recipes[0])
+    assert model.objects.add_missing(
+        user, [recipe.pk for recipe in recipes[:2]]
+    ) == {recipes[1].pk}
+
+    response = user_client.post(
+        f'/api/recipes/{action}/',
+        {'ids': [recipe.pk for recipe in recipes]}, format='json',
+    )
+    assert response.json()['results'] == [
+        {'id': recipes[0].pk, 'status': 'exists'},
+        {'id': recipes[1].pk, 'status': 'exists'},
+        {'id': recipes[2].pk, 'status': 'added'},
+    ]
+    assert [counter(recipe, model) for recipe in recipes] == [
+        count + 1 for count in before
+    ]
@@ -0,0 +1,35 @@
+"""Проверка ингредиентов при создании рецепта."""
+import pytest
+
+pytestmark = pytest.mark.django_db
+
+
+def test_duplicate_ingredient_as_string(user_client, payload):
+    pk = payload['ingredients'][0]['id']
+    payload['ingredients'].append({'id': str(pk), 'amount': 2})
+    response = user_client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 400
+    assert 'Ингредиенты не должны повторяться.' in str(response.data)
+
+
+def test_ingredient_id_is_not_a_number(user_client, payload):
+    payload['ingredients'][0]['id'] = 'соль'
+    response = user_client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('change', (
+    {'ingredients': [{'id': 1, 'amount': None}]},
+    {'ingredients': [{'id': 1, 'amount': {}}]},
+    {'ingredients': [{'id': 1}]},
+    {'ingredients': [{'amount': 1}]},
+    {'ingredients': [1]},
+    {'ingredients': 'соль'},
+    {'tags': ['abc']},
+    {'tags': [{}]},
+    {'tags': 'abc'},
+))
+def test_malformed_payload(user_client, payload, change):
+    payload.update(change)
+    response = user_client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 400
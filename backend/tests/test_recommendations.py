@@ -0,0 +1,29 @@
+"""Пересчёт похожих рецептов."""
+import pytest
+
+from recipes.models import Favorite, Recipe, SimilarRecipe
+from recipes.recommendations import refresh
+
+pytestmark = pytest.mark.django_db
+
+
+def neighbours():
+    return {
+        (pk, other): round(score, 9)
+        for pk, other, score in SimilarRecipe.objects.values_list(
+            'recipe', 'similar', 'score'
+        )
+    }
+
+
+def test_refresh_ignores_stale_counters(dataset):
+    before = neighbours()
+    stale = list(
+        Favorite.objects.order_by('recipe').values_list('recipe', flat=True)
+        .distinct()[:20]
+    )
+    Recipe.objects.update(favorites_count=0)
+    Recipe.objects.filter(pk__in=stale).update(neighbours_stale=True)
+
+    assert refresh() == len(stale)
+    assert neighbours() == before
@@ -0,0 +1,24 @@
+"""Выбор формата списка покупок."""
+import pytest
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize('accept, content_type', (
+    ('application/json', 'text/plain'),
+    ('*/*', 'text/plain'),
+    ('text/csv', 'text/csv'),
+))
+def test_download_shopping_cart_accept(user_client, accept, content_type):
+    response = user_client.get(
+        '/api/recipes/download_shopping_cart/', HTTP_ACCEPT=accept
+    )
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith(content_type)
+
+
+def test_download_shopping_cart_unknown_format(user_client):
+    response = user_client.get(
+        '/api/recipes/download_shopping_cart/?format=pdf'
+    )
+    assert response.status_code == 404
@@ -0,0 +1,24 @@
+"""Хранилище картинок по хешу содержимого."""
+from django.core.files.base import ContentFile
+
+from recipes.storage import ContentAddressedStorage
+
+
+def test_concurrent_save_keeps_hashed_name(tmp_path, monkeypatch):
+    storage = ContentAddressedStorage(location=str(tmp_path))
+    name = storage.save('recipes/photo.png', ContentFile(b'image'))
+
+    # Второй запрос проверил имя до того, как первый записал файл.
+    exists = storage.exists
+    calls = []
+
+    def racing_exists(path):
+        calls.append(path)
+        return len(calls) > 1 and exists(path)
+
+    monkeypatch.setattr(storage, 'exists', racing_exists)
+    assert storage.save('recipes/other.png', ContentFile(b'image')) == name
+    assert sorted(p.name for p in (tmp_path / 'recipes').iterdir()) == [
+        name.split('/')[-1]
+    ]
+    assert len(calls) > 1
@@ -0,0 +1,41 @@
+"""Кеш токенов авторизации."""
+import pytest
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.authentication import CachedTokenAuthentication, token_cache
+from users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def token(user):
+    return Token.objects.get_or_create(user=user)[0]
+
+
+@pytest.fixture
+def token_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def test_shared_cache_has_no_password_hash(user, token, token_client):
+    assert token_client.get('/api/users/me/').status_code == 200
+    data = cache.get(token_cache.cache_key(token.key))
+    assert data is not None
+    assert user.password.encode() not in data
+
+    cached_user, cached_token = CachedTokenAuthentication(
+    ).authenticate_credentials(token.key)
+    assert cached_user.pk == user.pk and cached_token.key == token.key
+    # Отложенное поле читается из базы.
+    assert cached_user.password == user.password
+
+
+def test_update_invalidates_cached_token(user, token_client):
+    assert token_client.get('/api/users/me/').status_code == 200
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    assert token_client.get('/api/users/me/').status_code == 401
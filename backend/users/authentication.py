@@ -0,0 +1,155 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+TOKEN_CACHE_TIMEOUT = getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300)
+TOKEN_CACHE_LOCAL_TIMEOUT = getattr(settings, 'TOKEN_CACHE_LOCAL_TIMEOUT', 30)
+TOKEN_CACHE_LOCAL_SIZE = getattr(settings, 'TOKEN_CACHE_LOCAL_SIZE', 1024)
+# Поля пользователя, которые хранит кеш. Хеша пароля среди них нет:
+# остальные поля восстановленного пользователя отложены и читаются из
+# базы при обращении, а save() записывает только загруженные поля.
+USER_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'is_active',
+    'is_staff', 'is_superuser',
+)
+TOKEN_FIELDS = ('key', 'user_id', 'created')
+
+
+class TokenCache:
+    """Токен -> поля пользователя и токена: LRU в памяти процесса поверх
+    общего кеша Django.
+
+    Сброс по ключу удаляет запись из общего кеша и из LRU своего процесса;
+    в остальных процессах запись живёт не дольше
+    TOKEN_CACHE_LOCAL_TIMEOUT секунд. Токены сбрасываются при save() и
+    удалении пользователя, а также при UserQuerySet.update(), см.
+    invalidate_user_tokens().
+    """
+
+    def __init__(self, timeout, local_timeout, local_size):
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self.local_size = local_size
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def cache_key(self, key):
+        return f'auth_token:{key}'
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._local.move_to_end(key)
+                self.stats['local_hits'] += 1
+                return pickle.loads(entry[1])
+        data = cache.get(self.cache_key(key))
+        if data is None:
+            self._count('misses')
+            return None
+        self._count('shared_hits')
+        self._set_local(key, data)
+        return pickle.loads(data)
+
+    def _set_local(self, key, data):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_timeout, data)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def set(self, key, value):
+        data = pickle.dumps(value)
+        cache.set(self.cache_key(key), data, self.timeout)
+        self._set_local(key, data)
+
+    def invalidate(self, key):
+        cache.delete(self.cache_key(key))
+        with self._lock:
+            self._local.pop(key, None)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, local_size=len(self._local))
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = (
+            round((lookups - stats['misses']) / lookups, 4) if lookups else 0
+        )
+        return stats
+
+
+token_cache = TokenCache(
+    TOKEN_CACHE_TIMEOUT, TOKEN_CACHE_LOCAL_TIMEOUT, TOKEN_CACHE_LOCAL_SIZE
+)
+
+
+def invalidate_user_tokens(users):
+    """Сбросить в кеше токены пользователей: users - QuerySet
+    пользователей или список их id."""
+    token_model = apps.get_model('authtoken', 'Token')
+    for key in token_model.objects.filter(user__in=users).values_list(
+        'key', flat=True
+    ):
+        token_cache.invalidate(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждый вызов API."""
+
+    @staticmethod
+    def cached_fields(model, names):
+        """Поля names в порядке полей модели, как ждёт Model.from_db()."""
+        return [
+            field.attname for field in model._meta.concrete_fields
+            if field.attname in names
+        ]
+
+    def values(self, instance, names):
+        return tuple(
+            getattr(instance, name)
+            for name in self.cached_fields(type(instance), names)
+        )
+
+    def dump(self, user, token):
+        return (
+            self.values(user, USER_FIELDS), self.values(token, TOKEN_FIELDS)
+        )
+
+    def load(self, data):
+        user_values, token_values = data
+        user_model, token_model = get_user_model(), self.get_model()
+        user = user_model.from_db(
+            DEFAULT_DB_ALIAS, self.cached_fields(user_model, USER_FIELDS),
+            user_values,
+        )
+        token = token_model.from_db(
+            DEFAULT_DB_ALIAS, self.cached_fields(token_model, TOKEN_FIELDS),
+            token_values,
+        )
+        token.user = user
+        return user, token
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, self.dump(user, token))
+            return user, token
+        user, token = self.load(cached)
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        return user, token
@@ -1,5 +1,24 @@
+from django.apps import apps
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+
+from .authentication import invalidate_user_tokens
+
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Изменение в обход save(), например блокировка через
+        update(is_active=False), тоже сбрасывает токены в кеше."""
+        user_ids = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        invalidate_user_tokens(user_ids)
+        return updated
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser):
@@ -13,6 +32,8 @@ class User(AbstractUser):
         max_length=150,
     )
 
+    objects = UserManager()
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'password']
 
@@ -22,6 +43,24 @@ class User(AbstractUser):
         verbose_name_plural = 'Пользователи'
 
 
+class FollowQuerySet(models.QuerySet):
+    def with_feed(self, recipes_limit=None):
+        """Подгрузить автора, число его рецептов и не больше recipes_limit
+        последних рецептов каждого автора - одним запросом на всех."""
+        recipe_model = apps.get_model('recipes', 'Recipe')
+        recipes = recipe_model.objects.order_by('-id')
+        if recipes_limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                recipe_model.objects.filter(author=OuterRef('author'))
+                .order_by('-id').values('pk')[:recipes_limit]
+            ))
+        return self.select_related('user').annotate(
+            recipes_count=Count('user__recipes'),
+        ).order_by('-id').prefetch_related(
+            Prefetch('user__recipes', queryset=recipes, to_attr='feed_recipes')
+        )
+
+
 class Follow(models.Model):
     """Модель подписок."""
 
@@ -38,6 +77,8 @@ class Follow(models.Model):
         related_name='follower',
     )
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         ordering = ['-id']
         verbose_name = 'Подписки'
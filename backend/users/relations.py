@@ -0,0 +1,79 @@
+from django.apps import apps
+from django.db import models
+from rest_framework import serializers
+
+RELATIONS = {
+    'favorites': ('recipes.Favorite', 'user', 'recipe_id'),
+    'shopping_cart': ('recipes.ShoppingCart', 'user', 'recipe_id'),
+    'follows': ('users.Follow', 'follower', 'user_id'),
+}
+
+
+class RelationLoader:
+    """Связи текущего пользователя с объектами страницы: избранное,
+    список покупок и подписки на авторов.
+
+    Живёт в пределах одного запроса. Сериализаторы списков заранее
+    сообщают id со страницы через prime(), а первый вопрос о связи
+    загружает её для всех накопленных id одним запросом. Так каждая
+    связь стоит не больше одного запроса, каким бы ни был размер
+    страницы.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._pending = {name: set() for name in RELATIONS}
+        self._loaded = {name: {} for name in RELATIONS}
+
+    def prime(self, name, ids):
+        loaded = self._loaded[name]
+        self._pending[name].update(pk for pk in ids if pk not in loaded)
+
+    def has(self, name, pk):
+        if self.user is None or self.user.is_anonymous:
+            return False
+        loaded = self._loaded[name]
+        if pk not in loaded:
+            self._pending[name].add(pk)
+            self._load(name)
+        return loaded[pk]
+
+    def _load(self, name):
+        model, user_field, target_field = RELATIONS[name]
+        pending = self._pending[name]
+        found = set(
+            apps.get_model(model).objects.filter(
+                **{user_field: self.user, f'{target_field}__in': pending}
+            ).values_list(target_field, flat=True)
+        )
+        for pk in pending:
+            self._loaded[name][pk] = pk in found
+        pending.clear()
+
+
+def get_relation_loader(request):
+    """Загрузчик связей, привязанный к запросу."""
+    if request is None:
+        return RelationLoader(None)
+    loader = getattr(request, '_relation_loader', None)
+    if loader is None or loader.user != request.user:
+        loader = RelationLoader(request.user)
+        request._relation_loader = loader
+    return loader
+
+
+class RelationListSerializer(serializers.ListSerializer):
+    """Передаёт загрузчику id всех объектов списка до их сериализации.
+
+    Дочерний сериализатор описывает, какие id нужны, в методе
+    prime_relations(loader, objects).
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        data = list(data)
+        self.child.prime_relations(
+            get_relation_loader(self.context.get('request')), data
+        )
+        return super().to_representation(data)
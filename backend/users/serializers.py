@@ -1,7 +1,8 @@
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 
-from users.models import Follow, User
+from users.models import User
+from users.relations import RelationListSerializer, get_relation_loader
 
 
 class CustomUserSerializer(UserSerializer):
@@ -17,9 +18,15 @@ class CustomUserSerializer(UserSerializer):
             'is_subscribed',
         )
         model = User
+        list_serializer_class = RelationListSerializer
+
+    def prime_relations(self, loader, users):
+        loader.prime('follows', (user.pk for user in users))
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        if request is None or obj.pk == request.user.pk:
             return False
-        return Follow.objects.filter(user=obj.pk, follower=user).exists()
+        return get_relation_loader(request).has('follows', obj.pk)
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_user_tokens, token_cache
+from .models import User
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_changed_user_tokens(sender, instance, created, **kwargs):
+    """Смена пароля, блокировка и любые другие изменения пользователя
+    сбрасывают его токен в кеше."""
+    if not created:
+        invalidate_user_tokens([instance.pk])
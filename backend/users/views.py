@@ -1,3 +1,4 @@
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 from djoser import views
 from rest_framework import permissions, status
@@ -5,8 +6,10 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 
+from api.middleware import profile_segment
 from api.serializers import FollowSerializer
 
+from .authentication import token_cache
 from .models import Follow, User
 from .serializers import CustomUserSerializer
 
@@ -21,14 +24,29 @@ class CustomUserViewSet(views.UserViewSet):
         serializer = self.get_serializer(user)
         return Response(serializer.data)
 
+    @action(detail=False, permission_classes=[permissions.IsAdminUser])
+    def token_cache(self, request):
+        """Статистика кеша токенов текущего процесса."""
+        return Response(token_cache.get_stats())
+
+    def get_recipes_limit(self):
+        try:
+            return max(int(self.request.query_params['recipes_limit']), 0)
+        except (KeyError, ValueError):
+            return None
+
     @action(detail=False, permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
-        queryset = Follow.objects.filter(follower=request.user)
+        queryset = Follow.objects.filter(follower=request.user).with_feed(
+            self.get_recipes_limit()
+        )
         page = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             page, many=True, context={'request': request}
         )
-        return self.get_paginated_response(serializer.data)
+        with profile_segment(request, 'serialize'):
+            data = serializer.data
+        return self.get_paginated_response(data)
 
     @action(
         methods=['POST', 'delete'],
@@ -43,29 +61,36 @@ class CustomUserViewSet(views.UserViewSet):
 
     def add_subscribe(self, model, request, id):
         follower = request.user
-        user = get_object_or_404(User, id=id)
-        if user == follower:
+        if str(follower.id) == str(id):
             raise ValidationError(
                 {'errors': 'Вы не можете подписаться на самого себя.'}
             )
-        elif model.objects.filter(user=user, follower=follower).exists():
+        try:
+            with transaction.atomic():
+                follow = model.objects.create(user_id=id, follower=follower)
+        except IntegrityError:
+            get_object_or_404(User, id=id)
             raise ValidationError(
                 {'errors': 'Вы уже подписаны на этого пользователя.'}
             )
-        follow = model.objects.create(user=user, follower=follower)
+        follow = model.objects.with_feed(self.get_recipes_limit()).get(
+            pk=follow.pk
+        )
         serializer = FollowSerializer(follow, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def del_subscribe(self, model, request, id):
         follower = request.user
-        user = get_object_or_404(User, id=id)
-        if user == follower:
+        if str(follower.id) == str(id):
             raise ValidationError(
                 {'errors': 'Вы не можете отписаться от самого себя.'}
             )
-        elif model.objects.filter(user=user, follower=follower).exists():
-            model.objects.filter(user=user, follower=follower).delete()
+        deleted, _ = model.objects.filter(
+            user_id=id, follower=follower
+        ).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(User, id=id)
         raise ValidationError(
             {'errors': 'Вы не подписаны на этого пользователя.'}
         )